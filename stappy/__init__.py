@@ -21,19 +21,44 @@
 # SOFTWARE.
 
 import sys as _sys
+import os as _os
 import pathlib as _pathlib
+import shutil as _shutil
 import json as _json
+import copy as _copy
+import weakref as _weakref
+import threading as _threading
+import struct as _struct
+import mmap as _mmap
 import zlib as _zlib
+import bz2 as _bz2
+import lzma as _lzma
+import fnmatch as _fnmatch
+import ast as _ast
+import sqlite3 as _sqlite3
+import contextlib as _contextlib
+import time as _time
+import hashlib as _hashlib
+import itertools as _itertools
+import concurrent.futures as _futures
 from collections import OrderedDict as _OrderedDict
+from collections import namedtuple as _namedtuple
+from collections import deque as _deque
 from functools import wraps
 
+try:
+    import fcntl as _fcntl
+except ImportError:
+    _fcntl = None
+
 import numpy as _np
 
 """
 stappy -- a storage-access protocol in python.
 
-currently byte-order (i.e. endian-ness) support is write-only.
-`stappy` does not support reading dataset that differ from native byte order.
+datasets are read in the byte order (i.e. endian-ness) they were written in,
+as arrays of the corresponding (possibly non-native) dtype without extra copies.
+use e.g. `get_dataset(name, byteorder='native')` to have them in another byte order.
 
 TODO:
 
@@ -73,9 +98,26 @@ DEBUG       = False
 SEP         = '/'
 INFO_TYPES  = (int, float, str)
 
-def debug(msg):
+def debug(msg, *args):
+    """prints `msg` if DEBUG is True.
+
+    `msg` is formatted with `args` (by `str.format`) only in that case,
+    so that the message costs nothing to build otherwise."""
     if DEBUG == True:
-        print(f"[DEBUG] {msg}")
+        print(f"[DEBUG] {msg.format(*args) if len(args) > 0 else msg}")
+
+def _flush_pending(pending, staging=None):
+    """writes back the attributes left in `pending` by a root that has not been
+    closed, when the root is garbage-collected or the interpreter exits
+    (and commits the files left in `staging`, in the durable mode).
+
+    note that `pending` (i.e. the entries in it) keeps the root alive until then."""
+    for entry in tuple(pending.values()):
+        if entry._valid == True:
+            entry.flush()
+            break
+    if (staging is not None) and (len(staging) > 0):
+        staging.commit()
 
 def abstractmethod(meth):
     @wraps(meth)
@@ -90,18 +132,464 @@ def is_namedtuple_struct(obj):
                 return True
     return False
 
+def normalized(value):
+    """returns `value` in the form it takes after a JSON round-trip
+    (i.e. tuples become lists), so that in-memory and loaded
+    attribute values can be compared."""
+    if isinstance(value, (tuple, list)):
+        return [normalized(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((key, normalized(item)) for key, item in value.items())
+    else:
+        return value
+
+def byteview(array):
+    """returns the C-ordered content of `array` as a flat uint8 array.
+    no copy is made if `array` is already C-contiguous."""
+    return _np.ascontiguousarray(array).reshape(-1).view(_np.uint8)
+
+BYTEORDERS = {
+    'native': '=',
+    'little': '<',
+    'big':    '>',
+    'swap':   'S',
+}
+
+def with_byteorder(array, byteorder=None):
+    """returns `array` in `byteorder` ('native', 'little', 'big' or 'swap',
+    or one of '=', '<', '>' and 'S'). `array` is returned as it is if `byteorder`
+    is None or it is already in `byteorder`.
+
+    the bytes are swapped in place if `array` is writeable (and not a memmap),
+    and otherwise are converted into a new array in one vectorized pass."""
+    if byteorder is None:
+        return array
+    order  = BYTEORDERS.get(byteorder, byteorder)
+    if order not in BYTEORDERS.values():
+        raise ValueError(f"unknown byte order: '{byteorder}' (expected one of {tuple(BYTEORDERS.keys())})")
+    target = array.dtype.newbyteorder(order)
+    if target == array.dtype:
+        return array
+    if array.flags.writeable and (not isinstance(array, _np.memmap)) \
+            and (target == array.dtype.newbyteorder('S')):
+        return array.byteswap(inplace=True).view(target)
+    return array.astype(target)
+
+def iter_byteblocks(array, blocksize):
+    """yields the C-ordered content of `array` as flat uint8 arrays of
+    at most `blocksize` bytes (or of one row, if a row is larger than that).
+
+    a C-contiguous `array` is yielded as views; otherwise, only
+    one block at a time is copied into the C order."""
+    if array.flags.c_contiguous or (array.ndim == 0):
+        flat = byteview(array)
+        for start in range(0, flat.size, blocksize):
+            yield flat[start:start + blocksize]
+    else:
+        rowsize = array[0].nbytes
+        if rowsize > blocksize:
+            for row in array:
+                yield from iter_byteblocks(row, blocksize)
+        else:
+            rows = blocksize // rowsize
+            for start in range(0, array.shape[0], rows):
+                yield byteview(array[start:start + rows])
+
+def bounded_map(func, iterable, workers=1):
+    """returns a generator of `func(item)` for each item in `iterable`, in order.
+
+    if `workers` is larger than 1, `func` is called on a pool of `workers` threads.
+    the items are consumed lazily, so that at most `2 * workers` items
+    (and their results) are held in memory at a time."""
+    if (workers is None) or (workers <= 1):
+        yield from map(func, iterable)
+        return
+    with _futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = _deque()
+        for item in iterable:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+_FICLONE = 0x40049409 # the ioctl request for reflinks on Linux
+
+def copy_file(src, dst, link=False, sync=False):
+    """copies the file `src` to `dst`, without passing the content through
+    the user space where possible (using `os.copy_file_range` or `os.sendfile`).
+
+    if `link` is 'hard', `dst` is made a hard link to `src`; if `link` is 'reflink',
+    `dst` is made a copy-on-write clone of `src` (on the file systems that support it).
+    in either case, it falls back to copying if the link cannot be made.
+
+    the copy is made as a temporary file next to `dst`, which then replaces `dst`,
+    so that an existing `dst` (that may be a hard link to another file, e.g. `src`)
+    is never written through. if `sync` is True, the copy is synchronized to the disk
+    before it replaces `dst`."""
+    if link not in (False, None, 'hard', 'reflink'):
+        raise ValueError(f"unknown link type: {repr(link)} (expected False, 'hard' or 'reflink')")
+    directory, name = _os.path.split(_os.fspath(dst))
+    tmp = _os.path.join(directory, f".{name}.{_os.getpid()}-{_threading.get_ident()}.copy")
+    try:
+        _copy_into(src, tmp, link)
+        if sync == True:
+            _fsync_file(tmp)
+        _os.replace(tmp, dst)
+    finally:
+        # `tmp` remains if it was a link to the same file as `dst` (`replace` does nothing then)
+        if _os.path.lexists(tmp):
+            _os.unlink(tmp)
+
+def _fsync_file(path):
+    fd = _os.open(path, _os.O_RDONLY)
+    try:
+        _os.fsync(fd)
+    finally:
+        _os.close(fd)
+
+def _copy_into(src, dst, link):
+    """copies (or links) `src` into the new file `dst` for `copy_file`."""
+    if link == 'hard':
+        try:
+            _os.link(src, dst)
+            return
+        except OSError:
+            pass
+    with open(src, 'rb', buffering=0) as fin, open(dst, 'wb', buffering=0) as fout:
+        if (link == 'reflink') and (_fcntl is not None):
+            try:
+                _fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+                return
+            except OSError:
+                pass
+        remaining = _os.fstat(fin.fileno()).st_size
+        for method in ('copy_file_range', 'sendfile'):
+            if (remaining == 0) or (not hasattr(_os, method)):
+                continue
+            try:
+                while remaining > 0:
+                    if method == 'copy_file_range':
+                        copied = _os.copy_file_range(fin.fileno(), fout.fileno(), remaining)
+                    else:
+                        copied = _os.sendfile(fout.fileno(), fin.fileno(), None, remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError:
+                # e.g. not supported by the file system; continue from the current offsets
+                pass
+        if remaining > 0:
+            _shutil.copyfileobj(fin, fout)
+
+def _fsync_all(paths, directory=False):
+    """synchronizes the files (or the directories) at `paths` to the disk.
+    the paths that do not exist (any more) are skipped."""
+    for path in paths:
+        try:
+            fd = _os.open(path, _os.O_RDONLY)
+        except FileNotFoundError:
+            continue # removed afterwards
+        try:
+            _os.fsync(fd)
+        except OSError:
+            if directory == False:
+                raise # some platforms cannot synchronize directories
+        finally:
+            _os.close(fd)
+
+class _Staging:
+    """the replacements of the files under a root that are deferred until
+    the group commit in the durable mode.
+
+    each replacement is staged as a (hidden) temporary file next to its target.
+    upon `commit()`, the temporary files are synchronized to the disk in one pass,
+    and the renames (as well as the hard links to be made, e.g. to the object store)
+    are recorded in a journal at the root that is synchronized before any of them
+    takes place. the directories are synchronized after the renames, and the journal
+    is removed at last. if a crash interrupts the renames, `recover()` completes them
+    from the journal when the root is opened again, so that a commit takes effect
+    either as a whole or not at all."""
+    _journal_name = ".durable_journal"
+    _ids          = _itertools.count()
+
+    def __init__(self, rootrepr):
+        self.root    = _pathlib.Path(rootrepr)
+        self.renames = _OrderedDict() # target --> temporary file
+        self.links   = _OrderedDict() # link --> source (temporary) file
+
+    def __len__(self):
+        return len(self.renames) + len(self.links)
+
+    def tempfile(self, file, kind='tmp'):
+        """returns a new temporary file name for `file`."""
+        file = _pathlib.Path(file)
+        return file.with_name(f".{file.name}.{_os.getpid()}-{_threading.get_ident()}-{next(self._ids)}.{kind}")
+
+    def stage(self, tmp, file):
+        """stages `tmp` to replace `file`, in place of the one staged before (if any)."""
+        previous = self.renames.pop(str(file), None)
+        self.renames[str(file)] = str(tmp)
+        if (previous is not None) and (previous != str(tmp)) and _os.path.lexists(previous):
+            _os.unlink(previous)
+
+    def resolve(self, file):
+        """returns the file that holds the current contents of `file`,
+        i.e. the one staged to replace it, or `file` itself."""
+        if len(self.renames) == 0:
+            return file
+        tmp = self.renames.get(str(file), None)
+        return file if tmp is None else _pathlib.Path(tmp)
+
+    def discard(self, file):
+        """discards the replacement staged for `file`. returns whether there was one."""
+        tmp = self.renames.pop(str(file), None)
+        if tmp is None:
+            return False
+        if _os.path.lexists(tmp):
+            _os.unlink(tmp)
+        return True
+
+    def discard_tree(self, directory):
+        """discards the replacements staged under `directory` (that is being removed)."""
+        prefix = _os.path.join(str(directory), '')
+        for file in tuple(self.renames.keys()):
+            if file.startswith(prefix):
+                self.discard(file)
+
+    def staged_names(self, directory):
+        """returns the names of the files staged to be created or replaced in `directory`."""
+        directory = str(directory)
+        return tuple(_os.path.basename(file) for file in self.renames.keys() \
+                     if _os.path.dirname(file) == directory)
+
+    def link_later(self, src, dst):
+        """makes `dst` a hard link to (the staged file) `src` upon the commit,
+        before `src` replaces its target."""
+        self.links.setdefault(str(dst), str(src))
+
+    def source(self, dst):
+        """returns the file that is to be linked as `dst` upon the commit, or `dst` itself."""
+        src = self.links.get(str(dst), None)
+        return dst if src is None else _pathlib.Path(src)
+
+    def discard_links(self, src):
+        """cancels the links to `src` that are to be made upon the commit (e.g. before `src` is modified)."""
+        for dst, source in tuple(self.links.items()):
+            if source == str(src):
+                del self.links[dst]
+
+    def commit(self, files=(), directories=()):
+        """synchronizes the staged files (and `files`) to the disk, and then
+        performs the renames and the links, and synchronizes the affected
+        directories (and `directories`)."""
+        renames, self.renames = self.renames, _OrderedDict()
+        links,   self.links   = self.links,   _OrderedDict()
+        _fsync_all(tuple(files) + tuple(renames.values()))
+        journal = self._write_journal(links, renames) if len(renames) + len(links) > 0 else None
+        self._apply(links, renames)
+        directories = _OrderedDict.fromkeys(str(directory) for directory in directories)
+        for file in tuple(renames.keys()) + tuple(links.keys()):
+            directories[_os.path.dirname(file)] = None
+        _fsync_all(directories.keys(), directory=True)
+        if journal is not None:
+            journal.unlink()
+            _fsync_all((str(self.root),), directory=True)
+
+    def _write_journal(self, links, renames):
+        journal = self.root / f"{self._journal_name}.{_os.getpid()}.json"
+        tmp     = journal.with_name(f"{journal.name}.tmp")
+        def _relative(items):
+            return [[_os.path.relpath(src, self.root), _os.path.relpath(dst, self.root)] for dst, src in items]
+        with open(tmp, 'w') as out:
+            _json.dump({'links': _relative(links.items()), 'renames': _relative(renames.items())}, out)
+            out.flush()
+            _os.fsync(out.fileno())
+        _os.replace(tmp, journal)
+        _fsync_all((str(self.root),), directory=True)
+        return journal
+
+    @staticmethod
+    def _apply(links, renames):
+        for dst, src in links.items():
+            try:
+                _os.link(src, dst)
+            except (FileExistsError, FileNotFoundError):
+                pass # already made, or the source has been discarded
+        for file, tmp in renames.items():
+            try:
+                _os.replace(tmp, file)
+            except FileNotFoundError:
+                pass # already renamed, or discarded
+
+    @classmethod
+    def recover(cls, rootrepr):
+        """completes the commits that were interrupted under `rootrepr`, if any."""
+        rootrepr = _pathlib.Path(rootrepr)
+        for journal in rootrepr.glob(f"{cls._journal_name}.*.json"):
+            with open(journal, 'r') as src:
+                content = _json.load(src)
+            def _absolute(items):
+                return _OrderedDict((str(rootrepr / dst), str(rootrepr / src)) for src, dst in items)
+            links, renames = _absolute(content['links']), _absolute(content['renames'])
+            cls._apply(links, renames)
+            directories = _OrderedDict.fromkeys(_os.path.dirname(file) for file in tuple(renames.keys()) + tuple(links.keys()))
+            _fsync_all(directories.keys(), directory=True)
+            journal.unlink()
+            _fsync_all((str(rootrepr),), directory=True)
+            debug("_Staging.recover: completed {} renames and {} links in '{}'", len(renames), len(links), rootrepr)
+
+def selection_bounds(selection, shape):
+    """splits the NumPy-style `selection` on an array of `shape` into
+    the (bounds, relative) tuple.
+
+    `bounds` is a tuple of (start, stop) for each axis, defining the smallest box
+    that contains all the selected elements. `relative` is the selection that
+    gives the same result when applied to the sub-array cut out by `bounds`.
+
+    basic (integers, slices, Ellipsis and None) as well as advanced
+    (integer and boolean arrays) indexing are supported."""
+    if not isinstance(selection, tuple):
+        selection = (selection,)
+
+    # boolean arrays are equivalent to their nonzero() indices
+    expanded = []
+    for item in selection:
+        if (not isinstance(item, (slice, int, _np.integer))) and (item is not None) and (item is not Ellipsis):
+            item = _np.asarray(item)
+            if item.dtype == bool:
+                expanded.extend(item.nonzero())
+                continue
+        expanded.append(item)
+
+    # replace Ellipsis with full slices
+    consumed = sum(1 for item in expanded if (item is not None) and (item is not Ellipsis))
+    ellipses = sum(1 for item in expanded if item is Ellipsis)
+    if ellipses > 1:
+        raise IndexError("an index can only have a single ellipsis ('...')")
+    elif consumed > len(shape):
+        raise IndexError(f"too many indices: array is {len(shape)}-dimensional, but {consumed} were indexed")
+    fill = [slice(None)] * (len(shape) - consumed)
+    if ellipses == 0:
+        expanded = expanded + fill
+    else:
+        pos      = [i for i, item in enumerate(expanded) if item is Ellipsis][0]
+        expanded = expanded[:pos] + fill + expanded[pos+1:]
+
+    bounds   = []
+    relative = []
+    axis     = 0
+    for item in expanded:
+        if item is None:
+            relative.append(None)
+            continue
+        size = shape[axis]
+        if isinstance(item, slice):
+            span = range(*item.indices(size))
+            if len(span) == 0:
+                bounds.append((0, 0))
+                relative.append(slice(0, 0))
+            else:
+                start = min(span[0], span[-1])
+                bounds.append((start, max(span[0], span[-1]) + 1))
+                stop  = span.stop - start
+                relative.append(slice(span.start - start, stop if stop >= 0 else None, span.step))
+        elif isinstance(item, (int, _np.integer)):
+            index = int(item)
+            if (index < -size) or (index >= size):
+                raise IndexError(f"index {index} is out of bounds for axis {axis} with size {size}")
+            index = index % size
+            bounds.append((index, index + 1))
+            relative.append(0)
+        else:
+            if not _np.issubdtype(item.dtype, _np.integer):
+                raise IndexError("arrays used as indices must be of integer (or boolean) type")
+            if _np.any((item < -size) | (item >= size)):
+                raise IndexError(f"index out of bounds for axis {axis} with size {size}")
+            item = _np.where(item < 0, item + size, item)
+            if item.size == 0:
+                bounds.append((0, 0))
+                relative.append(item)
+            else:
+                start = int(item.min())
+                bounds.append((start, int(item.max()) + 1))
+                relative.append(item - start)
+        axis += 1
+    return tuple(bounds), tuple(relative)
+
+def parse_dtype(spec):
+    """returns the numpy.dtype from its string representation
+    stored in the `dtype` attribute (i.e. `str(dtype)`), which
+    takes the form of a Python literal for structured dtypes."""
+    try:
+        return _np.dtype(spec)
+    except (TypeError, ValueError):
+        return _np.dtype(_ast.literal_eval(spec))
+
+def _glob_match(pattern, names, partial=False):
+    """returns whether the path components `names` match the glob components `pattern`
+    (where `**` matches any number of components). if `partial` is True, it returns
+    whether any path under `names` may match `pattern`."""
+    if len(names) == 0:
+        return (partial == True) or all(glob == '**' for glob in pattern)
+    elif len(pattern) == 0:
+        return False
+    elif pattern[0] == '**':
+        return _glob_match(pattern[1:], names, partial) or _glob_match(pattern, names[1:], partial)
+    else:
+        return _fnmatch.fnmatchcase(names[0], pattern[0]) and _glob_match(pattern[1:], names[1:], partial)
+
 def is_mapping(obj):
     for attr in ('keys', 'values', 'items', '__getitem__'):
         if not hasattr(obj, attr) or not callable(getattr(obj, attr)):
             return False
     return True
 
+def table_columns(table):
+    """returns the OrderedDict of (column name, array) of `table`, which is
+    either a structured array, a mapping of arrays or a named tuple of arrays.
+    all the columns must have the same length (i.e. the number of rows)."""
+    if isinstance(table, _np.ndarray):
+        if table.dtype.names is None:
+            raise ValueError(f"expected a structured array, got dtype '{table.dtype}'")
+        columns = _OrderedDict((name, table[name]) for name in table.dtype.names)
+    elif isinstance(table, tuple) and hasattr(table, '_fields'):
+        columns = _OrderedDict((name, _np.asarray(getattr(table, name))) for name in table._fields)
+    elif is_mapping(table):
+        columns = _OrderedDict((name, _np.asarray(value)) for name, value in table.items())
+    else:
+        raise ValueError(f"expected a structured array, a mapping or a named tuple of arrays, got {table.__class__}")
+    if len(columns) == 0:
+        raise ValueError("a table must have at least one column")
+    rows = None
+    for name, column in columns.items():
+        if (not isinstance(name, str)) or (len(name.strip()) == 0) or (SEP in name):
+            raise ValueError(f"invalid column name: {repr(name)}")
+        if column.ndim == 0:
+            raise ValueError(f"the column '{name}' is not an array")
+        if rows is None:
+            rows = column.shape[0]
+        elif column.shape[0] != rows:
+            raise ValueError(f"the column '{name}' has {column.shape[0]} rows (expected {rows})")
+    return columns
+
 class AttributeManager:
-    """interface for editing entry attributes."""
+    """interface for editing entry attributes.
+
+    modifications are written back lazily: they only mark the entry as
+    'dirty', and the attributes are written to the storage when `flush()`
+    or `close()` is called on the root (or when the root exits its `with` block).
+    assigning a value that is equal to the current one does not mark the entry as dirty.
+
+    `lock()` ... `commit()` groups modifications so that they can be
+    reverted as a whole by calling `rollback()` instead of `commit()`."""
+    _absent = object() # the marker of the keys that did not exist before `lock()`
+
     def __init__(self, interface):
         self._interface = interface
         self._updating  = False
-        self._dirtyflag = False
+        self._snapshot  = None
+        self._mutex     = _threading.RLock() # for batch operations on multiple threads
 
     def lock(self):
         if self._updating == True:
@@ -110,22 +598,42 @@ class AttributeManager:
         return True
 
     def flag(self):
-        if self._updating  == True:
-            self._dirtyflag = True
-        else:
-            self._interface._store_info()
+        self._interface._mark_dirty()
 
     def commit(self):
         self._updating  = False
-        if self._dirtyflag == True:
-            self._interface._store_info()
-            self._dirtyflag = False
+        self._snapshot  = None
 
     def rollback(self):
         self._updating   = False
-        if self._dirtyflag == True:
-            self._interface._load_info()
-            self._dirtyflag = False
+        if self._snapshot is not None:
+            info = self._interface._info
+            for key, value in self._snapshot.items():
+                if value is self._absent:
+                    info.pop(key, None)
+                else:
+                    info[key] = value
+            self._snapshot = None
+
+    def __backup(self, keypath):
+        # saves the top-level value only when it is modified for the first time,
+        # so that the cost does not depend on the size of the whole attributes
+        if self._updating == True:
+            if self._snapshot is None:
+                self._snapshot = _OrderedDict()
+            key  = keypath.split(SEP)[0]
+            info = self._interface._info
+            if key not in self._snapshot:
+                self._snapshot[key] = _copy.deepcopy(info[key]) if key in info else self._absent
+
+    def __equals(self, keypath, value):
+        try:
+            entry, key = self.__resolve_keypath(keypath, create=False)
+        except KeyError:
+            return False
+        if key not in entry.keys():
+            return False
+        return normalized(entry[key]) == normalized(value)
 
     def keys(self):
         return self._interface._info.keys()
@@ -141,16 +649,22 @@ class AttributeManager:
         return entry[key]
 
     def __setitem__(self, keypath, value):
-        entry, key = self.__resolve_keypath(keypath, create=True)
-        entry[key] = value
-        debug(f"AttributeManager: {repr(keypath)} <- {repr(value)}")
-        self.flag()
+        with self._mutex:
+            if self.__equals(keypath, value):
+                return
+            self.__backup(keypath)
+            entry, key = self.__resolve_keypath(keypath, create=True)
+            entry[key] = value
+            debug("AttributeManager: {!r} <- {!r}", keypath, value)
+            self.flag()
 
     def __delitem__(self, keypath):
-        entry, key = self.__resolve_keypath(keypath, create=False)
-        del entry[key]
-        debug(f"AttributeManager: `rm` {repr(keypath)}")
-        self.flag()
+        with self._mutex:
+            entry, key = self.__resolve_keypath(keypath, create=False)
+            self.__backup(keypath)
+            del entry[key]
+            debug("AttributeManager: `rm` {!r}", keypath)
+            self.flag()
 
     def __resolve_keypath(self, keypath, create=True):
         entry   = self._interface._info
@@ -172,7 +686,7 @@ class EntryCreation:
 
     def __getitem__(self, keypath):
         entry, key = self._interface.resolve_path(keypath, create=True)
-        if key in entry.dataset_names():
+        if entry.has_dataset(key):
             return entry.get_dataset(key)
         else:
             return entry.get_entry(key, create=True)
@@ -187,9 +701,9 @@ class EntryRetrieval:
 
     def __getitem__(self, keypath):
         entry, key = self._interface.resolve_path(keypath, create=False)
-        if key in entry.dataset_names():
+        if entry.has_dataset(key):
             return entry.get_dataset(key)
-        elif key in entry.child_names():
+        elif entry.has_child(key):
             return entry.get_entry(key, create=False)
         else:
             raise KeyError(key)
@@ -197,6 +711,415 @@ class EntryRetrieval:
     def __setitem__(self, keypath, value):
         raise NotImplementedError("use AbstractInterface[<keypath>] to modify entries/datasets")
 
+class LazyDataset:
+    """lazy handle to a dataset. called as AbstractInterface.dataset(<name>).
+
+    the shape and the data type of the dataset are taken from the entry attributes,
+    and no data is read until the handle is indexed: `handle[100:200, 3]` only reads
+    the part of the dataset that is required (as far as the interface supports it),
+    and `numpy.asarray(handle)` (or `handle[...]`) reads the whole dataset."""
+    def __init__(self, interface, name, **options):
+        if not interface.has_dataset(name):
+            raise NameError(f"dataset not found: {name}")
+        self._interface = interface
+        self._name      = name
+        self._options   = options
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({repr(self._interface)}, {repr(self._name)}, shape={self.shape}, dtype={self.dtype})"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def dtype(self):
+        return self._interface._describe_child_dataset(self._name)[0]
+
+    @property
+    def shape(self):
+        return self._interface._describe_child_dataset(self._name)[1]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        size = 1
+        for length in self.shape:
+            size *= length
+        return size
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        shape = self.shape
+        if len(shape) == 0:
+            raise TypeError("len() of unsized dataset")
+        return shape[0]
+
+    def __getitem__(self, selection):
+        return self._interface.get_dataset(self._name, selection=selection, **self._options)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._interface.get_dataset(self._name, **self._options)
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+def _merge_attrs(base, ours, theirs):
+    """returns the three-way merge of the attributes, where the changes
+    from `base` to `ours` are applied to `theirs` (the values are compared
+    in the normalized form, and nested dicts are merged recursively)."""
+    merged = _OrderedDict(theirs)
+    for key in base.keys():
+        if key not in ours:
+            merged.pop(key, None) # deleted
+    for key, value in ours.items():
+        if (key in base) and (normalized(value) == normalized(base[key])):
+            continue # unchanged
+        if isinstance(value, dict) and isinstance(merged.get(key, None), dict):
+            value = _merge_attrs(base.get(key, {}) if isinstance(base.get(key, None), dict) else {},
+                                 value, merged[key])
+        merged[key] = value
+    return merged
+
+def _flatten_attrs(info, prefix=''):
+    """yields the (keypath, value) pairs of the (nested) attributes `info`."""
+    for key, value in info.items():
+        if isinstance(value, dict):
+            yield from _flatten_attrs(value, f"{prefix}{key}{SEP}")
+        else:
+            yield f"{prefix}{key}", value
+
+class AttributeIndex:
+    """the persistent index of the attributes of the entries in a tree,
+    stored in a sqlite3 database.
+
+    each attribute is indexed by its keypath (e.g. "subject" or "data/shape"):
+    numbers are stored as numbers, strings as strings, and the other values
+    (e.g. lists) as their JSON representation. the paths of the entries
+    are those from the root (e.g. "/subject/session").
+    """
+    def __init__(self, path):
+        self.path  = _pathlib.Path(path)
+        self._lock = _threading.Lock()
+        self._conn = _sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS attrs (path TEXT NOT NULL, key TEXT NOT NULL, num REAL, text TEXT)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attrs_num ON attrs (key, num)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attrs_text ON attrs (key, text)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attrs_path ON attrs (path)")
+
+    @staticmethod
+    def _column_value(value):
+        """returns the (num, text) tuple to be stored for `value`."""
+        if isinstance(value, (bool, int, float)):
+            return float(value), None
+        elif isinstance(value, str):
+            return None, value
+        else:
+            return None, _json.dumps(normalized(value))
+
+    @staticmethod
+    def _subtree(path):
+        """returns the SQL condition and its parameters to select the paths at or under `path`."""
+        # '0' is next to SEP in the ASCII order
+        return "(path = ? OR (path >= ? AND path < ?))", (path, path + SEP, path + '0')
+
+    def update(self, entries):
+        """replaces the indexed attributes with those in `entries`,
+        an iterable of the (path, info) pairs."""
+        with self._lock, self._conn:
+            for path, info in entries:
+                self._conn.execute("DELETE FROM attrs WHERE path = ?", (path,))
+                self._conn.executemany("INSERT INTO attrs VALUES (?, ?, ?, ?)",
+                                       ((path, key) + self._column_value(value) \
+                                        for key, value in _flatten_attrs(info)))
+
+    def remove(self, path):
+        """removes the attributes of the entries at or under `path`."""
+        condition, params = self._subtree(path)
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM attrs WHERE {condition}", params)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM attrs")
+
+    def query(self, key, value=None, lo=None, hi=None, under=None):
+        """returns the sorted paths of the entries that have the attribute `key`.
+
+        - if `value` is given, the attribute must be equal to it.
+        - if `lo` and/or `hi` are given, the attribute must be within `lo <= attr <= hi`.
+        - otherwise, the attribute only has to exist.
+
+        if `under` is given, the entries are limited to those at or under the path."""
+        sql, params = ["SELECT DISTINCT path FROM attrs WHERE key = ?"], [key]
+        if value is not None:
+            num, text = self._column_value(value)
+            sql.append("AND num = ?" if num is not None else "AND text = ?")
+            params.append(num if num is not None else text)
+        elif (lo is not None) or (hi is not None):
+            column = 'text' if isinstance(lo if lo is not None else hi, str) else 'num'
+            if lo is not None:
+                sql.append(f"AND {column} >= ?")
+                params.append(lo)
+            if hi is not None:
+                sql.append(f"AND {column} <= ?")
+                params.append(hi)
+        if under is not None:
+            condition, subtree = self._subtree(under)
+            sql.append(f"AND {condition}")
+            params.extend(subtree)
+        sql.append("ORDER BY path")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(' '.join(sql), params)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+WalkItem = _namedtuple("WalkItem", ("path", "kind", "shape", "dtype", "attrs"))
+
+class DatasetCache:
+    """the LRU cache of the datasets read by `get_dataset`,
+    bounded by the total bytes of the cached arrays.
+
+    it is attached to a root upon opening, e.g. by
+    `NPYInterface.open(rootpath, cache=DatasetCache(1 << 30))`
+    (or simply by `cache=1 << 30`), and may be shared among roots.
+
+    each dataset is validated upon every lookup by its signature
+    (e.g. the modification time and the size of its file; see `_dataset_signature`),
+    and is discarded when it is put, appended to or deleted through the root.
+    the cached arrays are made read-only, because they are returned
+    to every caller. datasets read with keyword options (e.g. `mmap_mode`)
+    are not cached.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.nbytes    = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self._items    = _OrderedDict() # (root, path) --> (signature, array)
+        self._lock     = _threading.Lock()
+
+    def __repr__(self):
+        return f"DatasetCache({self.nbytes}/{self.max_bytes} bytes, hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self._items)
+
+    def _discard(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.nbytes -= item[1].nbytes
+
+    def get(self, key, signature):
+        """returns the cached array for `key`, or None if it is
+        not cached (or the cached one is out of date)."""
+        with self._lock:
+            item = self._items.get(key, None)
+            if (item is not None) and (item[0] != signature):
+                self._discard(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, signature, array):
+        """caches `array` (and makes it read-only), unless it exceeds `max_bytes` by itself."""
+        if array.nbytes > self.max_bytes:
+            return
+        array.flags.writeable = False
+        with self._lock:
+            self._discard(key)
+            self._items[key] = (signature, array)
+            self.nbytes     += array.nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, old) = self._items.popitem(last=False)
+                self.nbytes    -= old.nbytes
+                self.evictions += 1
+
+    def invalidate(self, root, path=None, subtree=True):
+        """discards the datasets of `root` that are located at or
+        under `path` (or all of them, if `path` is None).
+
+        if `subtree` is False, only the dataset at `path` is discarded
+        (without looking through the other cached datasets)."""
+        with self._lock:
+            if (path is not None) and (subtree == False):
+                self._discard((root, path))
+                return
+            for key in tuple(self._items.keys()):
+                if (key[0] == root) and ((path is None) or (key[1] == path) or key[1].startswith(path + SEP)):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """returns the counters as a dict."""
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    datasets=len(self._items), nbytes=self.nbytes, max_bytes=self.max_bytes)
+
+Span = _namedtuple("Span", ("name", "start", "duration", "depth", "fields"))
+
+class TimingHistogram:
+    """the histogram of durations (in seconds).
+
+    the bucket `i` counts the durations of less than `2**i` microseconds
+    (and not less than `2**(i-1)` microseconds), so that the quantiles
+    are resolved within a factor of two."""
+    def __init__(self):
+        self.count   = 0
+        self.total   = 0.0
+        self.min     = None
+        self.max     = 0.0
+        self.buckets = []
+
+    def __repr__(self):
+        return f"TimingHistogram(count={self.count}, total={self.total:.6f})"
+
+    def add(self, duration):
+        index = int(duration * 1e6).bit_length()
+        if index >= len(self.buckets):
+            self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += duration
+        self.min    = duration if (self.min is None) or (duration < self.min) else self.min
+        self.max    = max(self.max, duration)
+
+    def quantile(self, q):
+        """returns the (upper bound of the) `q`-quantile of the durations in seconds."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if (count > 0) and (seen >= rank):
+                return min((1 << index) * 1e-6, self.max)
+        return self.max
+
+    def stats(self):
+        """returns the summary as a dict (durations in seconds)."""
+        return dict(count=self.count, total=self.total,
+                    mean=(self.total / self.count) if self.count > 0 else None,
+                    min=self.min, max=self.max,
+                    p50=self.quantile(0.5), p90=self.quantile(0.9), p99=self.quantile(0.99))
+
+class Instrumentation:
+    """the counters and the timing histograms of the I/O on a root.
+
+    it is attached to a root upon opening, e.g. by
+    `NPYInterface.open(rootpath, instrumentation=True)`
+    (or by `instrumentation=Instrumentation(callbacks)` to share it among roots),
+    and is available as `root.instrumentation`.
+
+    the operations of the roots are timed as the following spans:
+
+    - 'scan': listing a directory (with the 'scan.items' counter).
+    - 'info.load', 'info.store': loading and storing the attributes of an entry.
+    - 'dict.load', 'dict.store': loading and storing a dict.
+    - 'dataset.load', 'dataset.store', 'dataset.append': reading and writing datasets
+      (with the 'dataset.bytes_read' and 'dataset.bytes_written' counters).
+    - 'codec.encode', 'codec.decode': (de)compressing the blocks of datasets
+      (with the 'codec.raw_bytes' and 'codec.encoded_bytes' counters).
+    - the 'dataset.dedup_hits' and 'dataset.dedup_bytes' counters count the datasets
+      (and their bytes) that were linked to the existing objects in the dedup mode.
+    - 'flush', 'sync': writing back the attributes, and synchronizing files to the disk.
+
+    any code may be timed in the same way by `with instrumentation.span(name, **fields):`.
+    each `callbacks` is called with the Span (name, start, duration, depth, fields)
+    whenever a span finishes, e.g. to build the trace of a request.
+    spans are nested per thread, i.e. `depth` is the number of the enclosing spans.
+    """
+    def __init__(self, callbacks=()):
+        self.counters   = _OrderedDict() # name --> value
+        self.histograms = _OrderedDict() # name --> TimingHistogram
+        self._callbacks = list(callbacks)
+        self._lock      = _threading.Lock()
+        self._local     = _threading.local()
+
+    def __repr__(self):
+        return f"Instrumentation({len(self.counters)} counters, {len(self.histograms)} histograms)"
+
+    def subscribe(self, callback):
+        """registers `callback` to be called with each finished Span."""
+        self._callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def count(self, name, value=1):
+        """adds `value` to the counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, duration):
+        """adds `duration` (in seconds) to the histogram `name`."""
+        with self._lock:
+            histogram = self.histograms.get(name, None)
+            if histogram is None:
+                histogram = self.histograms[name] = TimingHistogram()
+            histogram.add(duration)
+
+    @_contextlib.contextmanager
+    def span(self, name, **fields):
+        """returns a context manager that times its body as the span `name`.
+        the `fields` dict is yielded, so that the body may add items to it.
+        if the body raises an exception, its class name is set as the 'error' field."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        start = _time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields['error'] = e.__class__.__name__
+            raise
+        finally:
+            duration = _time.perf_counter() - start
+            stack.pop()
+            self.observe(name, duration)
+            if len(self._callbacks) > 0:
+                event = Span(name, start, duration, len(stack), fields)
+                for callback in tuple(self._callbacks):
+                    callback(event)
+
+    def stats(self):
+        """returns the counters and the summaries of the histograms as a dict."""
+        with self._lock:
+            return dict(counters=dict(self.counters),
+                        histograms=dict((name, histogram.stats()) for name, histogram in self.histograms.items()))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+_NO_SPAN = _contextlib.nullcontext()
+
+def _span(instrumentation, name, **fields):
+    """returns `instrumentation.span(name, **fields)`, or a no-op context
+    manager if `instrumentation` is None."""
+    return _NO_SPAN if instrumentation is None else instrumentation.span(name, **fields)
+
 class AbstractInterface:
     """base class that provides common functionality.
 
@@ -227,6 +1150,13 @@ class AbstractInterface:
     """
     _info_suffix = ".json"
     _data_suffix = None
+    _dataset_attrs    = ('dtype', 'shape', 'byteorder') # attributes of datasets specific to the interface
+    _copy_block_size  = 1 << 26
+    cache             = None # DatasetCache of the root
+    indexed           = False
+    durable           = False
+    instrumentation   = None # Instrumentation of the root
+    _attrindex        = None # AttributeIndex of the root
     _byteorders = {
         '<': 'little',
         '>': 'big',
@@ -289,16 +1219,89 @@ class AbstractInterface:
         pass
 
     @abstractmethod
-    def _load_child_dataset(self, name):
+    def _load_child_dataset(self, name, **options):
         """tries to get the specified child dataset in this entry.
-        it must return the corresponding numpy.ndarray object."""
+        it must return the corresponding numpy.ndarray object.
+
+        `options` are the keyword arguments given to `get_dataset`;
+        implementations should reject the ones they do not understand."""
         pass
 
+    def _describe_child_dataset(self, name):
+        """returns the (dtype, shape) tuple of the child dataset `name`.
+
+        the default implementation refers to the entry attributes,
+        and loads the dataset only if they are not available."""
+        try:
+            return parse_dtype(self.attrs[f"{name}/dtype"]), tuple(self.attrs[f"{name}/shape"])
+        except (KeyError, TypeError):
+            data = self.get_dataset(name)
+            return data.dtype, data.shape
+
+    def _dataset_signature(self, name):
+        """returns the value that changes whenever the child dataset `name`
+        is modified (e.g. the modification time and the size of the file),
+        so that the cached dataset can be validated.
+
+        the default implementation returns None, i.e. the cached datasets
+        are only invalidated by the modifications through the root."""
+        return None
+
+    def _attribute_index_file(self):
+        """returns the path of the AttributeIndex database of the root."""
+        raise NotImplementedError("_attribute_index_file")
+
+    def _walk_contents(self, path):
+        """returns the (attrs, children, datasets) tuple of the entry at `path`
+        (from the root) for `walk`.
+
+        the default implementation instantiates the entry; subclasses may
+        override it to inspect the storage directly."""
+        entry = self._entry_at(path)
+        return entry._info, entry.child_names(), entry.dataset_names()
+
+    def _walk_describe(self, path, name, attrs):
+        """returns the (dtype, shape) tuple of the dataset `name` of the entry at `path`
+        for `walk`, preferably from the attributes of the dataset `attrs`."""
+        try:
+            return parse_dtype(attrs['dtype']), tuple(attrs['shape'])
+        except (KeyError, TypeError):
+            return self._entry_at(path)._describe_child_dataset(name)
+
+    def _load_child_region(self, name, selection, **options):
+        """returns the part of the child dataset `name` that is specified by `selection`.
+
+        the default implementation loads the whole dataset; subclasses
+        may override it to read only the part of the storage that is required."""
+        return self._load_child_dataset(name, **options)[selection]
+
     @abstractmethod
-    def _store_child_dataset(self, name, value):
-        """store `value` with the specified `name`."""
+    def _store_child_dataset(self, name, value, **options):
+        """store `value` with the specified `name`.
+
+        `options` are the keyword arguments given to `put_dataset`."""
         pass
 
+    def _put_child_dataset(self, name, value, **options):
+        """stores `value` as the child dataset `name` for `put_dataset`.
+
+        the default implementation calls `_store_child_dataset`; subclasses
+        may override it to store the datasets in another way (e.g. deduplicated)."""
+        self._store_child_dataset(name, value, **options)
+
+    def _append_child_dataset(self, name, value):
+        """appends `value` to the end of the existing child dataset `name`
+        along its first axis. `value` has been already validated to have
+        the matching dtype and shape.
+
+        the default implementation re-writes the whole dataset; subclasses
+        should override it to append the data in place."""
+        data     = self._load_child_dataset(name)
+        combined = _np.empty((data.shape[0] + value.shape[0],) + data.shape[1:], dtype=value.dtype)
+        combined[:data.shape[0]] = data
+        combined[data.shape[0]:] = value
+        self._store_child_dataset(name, combined)
+
     @abstractmethod
     def _delete_child_dataset(self, name):
         """remove the dataset that has `name`."""
@@ -326,32 +1329,51 @@ class AbstractInterface:
         if not created:
             root._load_info()
 
-        def _update(src):
-            return root.__class__._copy_from_another_root(src=src, dest=root)
+        def _update(src, link=False):
+            return root.__class__._copy_from_another_root(src=src, dest=root, link=link)
         def _close():
             return root.__class__.close(root)
         root.update = _update
         root.close  = _close
         if len(kwargs) > 0:
-            for key, value in kwargs:
+            for key, value in kwargs.items():
                 setattr(root, key, value)
+        if (root.cache is not None) and (not isinstance(root.cache, DatasetCache)):
+            root.cache = DatasetCache(root.cache)
+        if root.instrumentation == True:
+            root.instrumentation = Instrumentation()
+        elif root.instrumentation == False:
+            root.instrumentation = None
+        if root.indexed == True:
+            indexfile       = root._attribute_index_file()
+            created         = not _os.path.exists(indexfile)
+            root._attrindex = AttributeIndex(indexfile)
+            if created == True:
+                root.reindex()
+        root._finalizer = _weakref.finalize(root, _flush_pending, root._pending)
         return root
 
     @classmethod
     def close(cls, rootobj=None):
-        """free the physical representation of this root object."""
+        """writes back any pending modifications, and
+        free the physical representation of this root object."""
         if not rootobj.is_root():
             raise ValueError("close() not applied to the root object")
         else:
+            rootobj.flush()
+            rootobj._finalizer.detach()
+            rootobj._discard_cached()
+            if rootobj._attrindex is not None:
+                rootobj._attrindex.close()
             cls._free_root_repr(rootobj._repr)
+            rootobj._release_entries()
             rootobj.invalidate()
 
     @classmethod
-    def _copy_from_another_root(cls, src=None, dest=None):
+    def _copy_from_another_root(cls, src=None, dest=None, link=False):
         if (not src.is_root()) or (not dest.is_root()):
             raise ValueError("invalid call to copy()")
-        for name, value in src.items():
-            dest[name] = value
+        dest._copy_contents(src, link=link)
 
     def __init__(self, name, parent=None):
         """creates (ensures) the directory with the matched name.
@@ -371,13 +1393,28 @@ class AbstractInterface:
         self._name  = name
         self._info  = _OrderedDict()
         self._parent= parent
-        if parent is not None:
+        if parent is None:
+            self._rootobj = self
+            self._pending = _OrderedDict() # path --> entry with unwritten attributes
+            self._unsynced= _OrderedDict() # path --> whether it is a directory
+            self._transactions = 0
+            self._entries = _weakref.WeakValueDictionary() # path --> live entry
+        else:
+            self._rootobj = parent._rootobj
             self._root  = parent._root
             self._repr  = self._get_volatile_repr(parent, name)
             self._path  = f"{parent._path}{SEP}{name}"
-            self._load_info()
+            live        = self._rootobj._entries.get(self._path, None)
+            if (live is not None) and (live._valid == True):
+                # share the (possibly unwritten) attributes
+                self._info = live._info
+            else:
+                with self._span('info.load'):
+                    self._load_info()
         self.attrs  = AttributeManager(self)
         self._valid = True
+        if parent is not None:
+            self._rootobj._entries[self._path] = self
 
     def __repr__(self):
         if self._valid == True:
@@ -385,6 +1422,15 @@ class AbstractInterface:
         else:
             return f"{self.__class__.__name__}(#invalid)"
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.is_root():
+            self.__class__.close(self)
+        else:
+            self.flush()
+
     def __getattr__(self, name):
         if name == 'create':
             return EntryCreation(self)
@@ -395,9 +1441,9 @@ class AbstractInterface:
 
     def __getitem__(self, keypath):
         entry, key = self.resolve_path(keypath, create=False)
-        if key in entry.child_names():
+        if entry.has_child(key):
             return entry.get_entry(key, create=False)
-        elif key in entry.dataset_names():
+        elif entry.has_dataset(key):
             return entry.get_dataset(key)
         else:
             raise KeyError(key)
@@ -420,10 +1466,10 @@ class AbstractInterface:
 
     def __delitem__(self, keypath):
         entry, key = self.resolve_path(keypath, create=False)
-        if key in entry.child_names():
+        if entry.has_child(key):
             # entry
             entry.delete_entry(key)
-        elif key in entry.dataset_names():
+        elif entry.has_dataset(key):
             # dataset
             entry.delete_dataset(key)
         else:
@@ -449,10 +1495,207 @@ class AbstractInterface:
             entry = entry.get_entry(key, create=create)
         return entry, keys[-1]
 
+    def _entry_at(self, path):
+        """returns the entry at `path` (from the root)."""
+        entry = self._rootobj
+        for name in path.split(SEP)[1:]:
+            entry = entry.get_entry(name, create=False)
+        return entry
+
+    def walk(self, pattern=None, depth=None):
+        """yields the WalkItem(path, kind, shape, dtype, attrs) tuples of the entries
+        (`kind='entry'`) and the datasets (`kind='dataset'`) under this entry
+        in the depth-first order, without loading any dataset.
+
+        `path` is relative to this entry. `shape` and `dtype` are taken from the
+        attributes of the datasets (they are None for the entries).
+
+        `pattern` is the glob pattern to select the paths: `*`, `?` and `[...]`
+        match within a path component, and `**` matches any number of components.
+        the subtrees that cannot match `pattern` are not visited.
+        `depth` limits the number of the components of the paths."""
+        globs = None if pattern is None else pattern.strip(SEP).split(SEP)
+        stack = [(self._path, ())]
+        while len(stack) > 0:
+            path, names = stack.pop()
+            attrs, children, datasets = self._walk_contents(path)
+            if (len(names) > 0) and ((globs is None) or _glob_match(globs, names)):
+                yield WalkItem(SEP.join(names), 'entry', None, None,
+                               _OrderedDict((key, value) for key, value in attrs.items() if key not in datasets))
+            if (depth is not None) and (len(names) >= depth):
+                continue
+            for name in datasets:
+                item = names + (name,)
+                if (globs is None) or _glob_match(globs, item):
+                    info         = _OrderedDict(attrs.get(name, {}))
+                    dtype, shape = self._walk_describe(path, name, info)
+                    yield WalkItem(SEP.join(item), 'dataset', shape, dtype, info)
+            for name in reversed(tuple(children)):
+                item = names + (name,)
+                if (globs is None) or _glob_match(globs, item, partial=True):
+                    stack.append((f"{path}{SEP}{name}", item))
+
+    def _span(self, name, **fields):
+        """returns the context manager that times its body as the span `name`
+        on the Instrumentation of the root (or does nothing if there is none)."""
+        return _span(self._rootobj.instrumentation, name, **fields)
+
+    def _count(self, name, value=1):
+        """adds `value` to the counter `name` of the Instrumentation of the root (if any)."""
+        instrumentation = self._rootobj.instrumentation
+        if instrumentation is not None:
+            instrumentation.count(name, value)
+
+    def _mark_dirty(self):
+        """registers this entry as having attributes that have not been written back."""
+        self._rootobj._pending[self._path] = self
+
+    def _write_back(self):
+        """writes back the attributes of this entry, if they have been modified."""
+        if self._rootobj._pending.pop(self._path, None) is not None:
+            with self._span('info.store', path=self._path):
+                self._store_info()
+            self._index_attributes((self,))
+
+    def flush(self):
+        """writes back the modified attributes of all the entries in the tree.
+        in the durable mode, the files written since the last flush are also
+        committed as a group (unless it is called during a transaction)."""
+        pending = self._rootobj._pending
+        stored  = []
+        with self._span('flush'):
+            while len(pending) > 0:
+                path, entry = pending.popitem(last=False)
+                with self._span('info.store', path=path):
+                    entry._store_info()
+                stored.append(entry)
+            self._index_attributes(stored)
+            self._write_back_root()
+        if self._rootobj._transactions == 0:
+            self._sync_pending()
+
+    def _write_back_root(self):
+        """writes back the states kept at the root, after the attributes
+        of the entries have been written back in `flush()`."""
+        pass
+
+    def _sync_later(self, path, directory=False):
+        """registers the file (or the directory) at `path` to be
+        synchronized to the disk upon the next group commit.
+        it does nothing unless the root is in the durable mode."""
+        if self._rootobj.durable == True:
+            self._rootobj._unsynced[str(path)] = directory
+
+    def _sync_pending(self):
+        """synchronizes the registered files and then the registered
+        directories to the disk, all at once (i.e. a group commit)."""
+        root = self._rootobj
+        if len(root._unsynced) == 0:
+            return
+        unsynced, root._unsynced = root._unsynced, _OrderedDict()
+        with self._span('sync', paths=len(unsynced)):
+            _fsync_all(path for path, isdir in unsynced.items() if isdir == False)
+            _fsync_all((path for path, isdir in unsynced.items() if isdir == True), directory=True)
+        debug("AbstractInterface._sync_pending: synchronized {} paths", len(unsynced))
+
+    @_contextlib.contextmanager
+    def transaction(self):
+        """returns a context manager that groups the writes to the tree.
+
+        in the durable mode, the files written within the context are
+        synchronized to the disk all at once when the (outermost) context exits,
+        instead of upon every `flush()`. note that the writes are not rolled back
+        when the context exits with an exception."""
+        root = self._rootobj
+        root._transactions += 1
+        try:
+            yield root
+        finally:
+            root._transactions -= 1
+            if root._transactions == 0:
+                root.flush()
+
+    def _index_attributes(self, entries):
+        """updates the AttributeIndex of the root (if any) with the attributes of `entries`."""
+        index = self._rootobj._attrindex
+        if (index is not None) and (len(entries) > 0):
+            index.update((entry._path, entry._info) for entry in entries)
+
+    def reindex(self):
+        """(re-)builds the AttributeIndex of the root from the attributes of the whole tree."""
+        if not self.is_root():
+            raise ValueError("reindex() not applied to the root object")
+        if self._attrindex is None:
+            self._attrindex = AttributeIndex(self._attribute_index_file())
+        self.flush()
+        infos = _OrderedDict([('', _OrderedDict(self._info))])
+        for item in self.walk():
+            if item.kind == 'entry':
+                infos[f"{SEP}{item.path}"] = item.attrs
+            else:
+                parent, _, name = item.path.rpartition(SEP)
+                infos[f"{SEP}{parent}" if parent else ''][name] = item.attrs
+        self._attrindex.clear()
+        self._attrindex.update(infos.items())
+        self.indexed = True
+
+    def query(self, key, value=None, lo=None, hi=None):
+        """returns the paths (relative to this entry) of the entries at or
+        under this entry that have the attribute `key` (a keypath such as "a/b"):
+
+        - `query(key, value)`: the attribute equals `value`.
+        - `query(key, lo=lo, hi=hi)`: the attribute is within `lo <= attr <= hi`
+          (either of the bounds may be omitted).
+        - `query(key)`: the attribute exists.
+
+        the root must be opened with `indexed=True`."""
+        index = self._rootobj._attrindex
+        if index is None:
+            raise ValueError("the root is not opened with indexed=True")
+        self.flush()
+        paths = index.query(key, value=value, lo=lo, hi=hi, under=self._path if self._path else None)
+        return [path[len(self._path) + 1:] for path in paths]
+
+    def _discard_pending(self, path):
+        """discards the unwritten attributes of the entries
+        that are located at or under `path`."""
+        pending = self._rootobj._pending
+        for key in tuple(pending.keys()):
+            if (key == path) or key.startswith(path + SEP):
+                del pending[key]
+
+    def _discard_subtree(self, path):
+        """discards the states of the tree (the pending attributes, the cached datasets,
+        the indexed attributes and the live entry objects) at or under `path`,
+        after the subtree has been removed from the storage."""
+        self._discard_pending(path)
+        self._discard_cached(path)
+        if self._rootobj._attrindex is not None:
+            self._rootobj._attrindex.remove(path)
+        self._release_entries(path)
+
+    def _discard_cached(self, path=None, subtree=True):
+        """discards the cached datasets that are located at or
+        under `path` (or all of them, if `path` is None).
+        if `subtree` is False, only the dataset at `path` is discarded."""
+        cache = self._rootobj.cache
+        if cache is not None:
+            cache.invalidate(str(self._root), path, subtree=subtree)
+
+    def _release_entries(self, path=None):
+        """invalidates the live entry objects of the tree that are
+        located at or under `path` (or all of them, if `path` is None)."""
+        entries = self._rootobj._entries
+        for key, entry in tuple(entries.items()):
+            if (path is None) or (key == path) or key.startswith(path + SEP):
+                del entries[key]
+                entry.invalidate()
+
     def invalidate(self):
         """makes this object invalid as a reference."""
         self._name   = None
         self._root   = None
+        self._rootobj= None
         self._parent = None
         self._info   = None
         self._repr   = None
@@ -473,6 +1716,16 @@ class AbstractInterface:
         """returns a sequence of datasets that this entry contains."""
         return self._list_contents(children=False, datasets=True)
 
+    def has_child(self, name):
+        """returns whether this entry has the child entry `name`.
+        subclasses may override it to provide faster lookups."""
+        return name in self.child_names()
+
+    def has_dataset(self, name):
+        """returns whether this entry has the dataset `name`.
+        subclasses may override it to provide faster lookups."""
+        return name in self.dataset_names()
+
     def values(self):
         """returns a generator of children (entries and datasets)."""
         for name in self.keys():
@@ -486,6 +1739,11 @@ class AbstractInterface:
         for name in self.dataset_names():
             yield self.get_dataset(name)
 
+    def dataset(self, name, **options):
+        """returns a LazyDataset handle to the dataset with the specified name.
+        any keyword `options` are used when the handle reads the dataset."""
+        return LazyDataset(self, name, **options)
+
     def items(self):
         for name in self.keys():
             yield name, self.__getitem__(name)
@@ -494,17 +1752,24 @@ class AbstractInterface:
         """returns the specified child entry.
         if `create` is True and the entry does not exist,
         the entry is newly generated before being returned."""
-        if name in self.child_names():
-            entry = self._get_child_entry(name)
+        if self.has_child(name):
+            entry = self._rootobj._entries.get(f"{self._path}{SEP}{name}", None)
+            if (entry is None) or (entry._valid == False):
+                entry = self._get_child_entry(name)
         else:
             if create == False:
                 raise NameError(f"name not found: {name}")
             entry = self.__class__(name, parent=self)
         return entry
 
-    def put_entry(self, name, entry, overwrite=True, deletesource=False):
-        """puts `entry` to this entry with `name`."""
-        if name in self.child_names():
+    def put_entry(self, name, entry, overwrite=True, deletesource=False, link=False):
+        """puts (a copy of) `entry` to this entry with `name`.
+
+        `entry` may belong to any interface. if the interface supports it
+        (e.g. FileSystemInterface between the same interface types),
+        the datasets are copied without being decoded, and `link` can be
+        used to make the copies as links (see `copy_file`)."""
+        if self.has_child(name):
             if overwrite == False:
                 raise NameError(f"entry '{name}' already exists")
             else:
@@ -512,23 +1777,55 @@ class AbstractInterface:
 
         # copy recursively
         child = self.get_entry(name, create=True)
-        child._info.update(entry._info)
-        for dataname in entry.dataset_names():
-            child.put_dataset(dataname, entry.get_dataset(dataname))
-        for grandchild in entry.child_names():
-            child.put_entry(grandchild, entry.get_entry(grandchild))
-        child._store_info()
+        child._copy_contents(entry, link=link)
 
         if deletesource == True:
             if entry._parent is None:
                 # TODO: remove the root file
                 pass
             else:
-                entry._parent.delete_entry(entry.name)
+                entry._parent.delete_entry(entry._name)
+
+    def _copy_contents(self, source, link=False):
+        """copies the attributes, datasets and child entries of `source` into this entry.
+
+        the default implementation decodes and re-encodes the datasets one by one
+        (see `_copy_dataset`). the attributes specific to the interface of `source`
+        (i.e. its `_dataset_attrs`) are not copied."""
+        datanames = source.dataset_names()
+        for key, value in source._info.items():
+            if (key in datanames) and isinstance(value, dict):
+                value = _OrderedDict((attr, item) for attr, item in value.items() \
+                                     if attr not in source._dataset_attrs)
+            self._info[key] = _copy.deepcopy(value)
+        self._mark_dirty()
+        for dataname in datanames:
+            self._copy_dataset(source, dataname)
+        for grandchild in source.child_names():
+            self.put_entry(grandchild, source.get_entry(grandchild, create=False), link=link)
+
+    def _copy_dataset(self, source, name):
+        """copies the dataset `name` from `source` into this entry.
+
+        if `source` supports partial reads (i.e. it overrides `_load_child_region`),
+        large datasets are copied in blocks of rows of approximately
+        `_copy_block_size` bytes, so that they are not loaded into memory at once."""
+        dtype, shape = source._describe_child_dataset(name)
+        rowsize      = dtype.itemsize
+        for length in shape[1:]:
+            rowsize *= length
+        partial = type(source)._load_child_region is not AbstractInterface._load_child_region
+        if (not partial) or (len(shape) == 0) or (rowsize == 0) or (rowsize * shape[0] <= self._copy_block_size):
+            self.put_dataset(name, source.get_dataset(name))
+            return
+        rows = max(1, self._copy_block_size // rowsize)
+        self.put_dataset(name, source.get_dataset(name, selection=slice(0, rows)))
+        for start in range(rows, shape[0], rows):
+            self.append_dataset(name, source.get_dataset(name, selection=slice(start, start + rows)))
 
     def delete_entry(self, name):
         """deletes a child entry with 'name' from this entry."""
-        if name not in self.child_names():
+        if not self.has_child(name):
             raise NameError(f"entry '{name}' does not exist")
         child = self.get_entry(name, create=False)
 
@@ -537,32 +1834,71 @@ class AbstractInterface:
             child.delete_dataset(dataname)
         for grandchild in child.child_names():
             child.delete_entry(grandchild)
+        self._rootobj._pending.pop(child._path, None)
         child._delete_info()
 
         self._delete_child_entry(name, child)
-        child.invalidate()
+        self._discard_subtree(child._path)
+
+    def get_dataset(self, name, selection=None, **options):
+        """returns the dataset with the specified name.
 
-    def get_dataset(self, name):
-        """returns the dataset with the specified name."""
-        if name not in self.dataset_names():
+        if `selection` is specified, only the corresponding part of
+        the dataset (i.e. `dataset[selection]`) is returned.
+
+        the dataset is returned in the byte order it was stored in, unless
+        `byteorder` is specified (e.g. 'native'; see `with_byteorder`).
+
+        any other keyword `options` are passed to the `_load_child_dataset`
+        implementation of the interface (e.g. `mmap_mode` for NPYInterface)."""
+        if not self.has_dataset(name):
             raise NameError(f"dataset not found: {name}")
-        data = self._load_child_dataset(name)
+        byteorder = options.pop('byteorder', None)
+        cache = self._rootobj.cache if len(options) == 0 else None
+        if cache is not None:
+            key       = (str(self._root), f"{self._path}{SEP}{name}")
+            signature = self._dataset_signature(name)
+            cached    = cache.get(key, signature)
+            if cached is not None:
+                return with_byteorder(cached if selection is None else cached[selection], byteorder)
+        with self._span('dataset.load', path=f"{self._path}{SEP}{name}"):
+            if selection is not None:
+                data = self._load_child_region(name, selection, **options)
+            else:
+                data = self._load_child_dataset(name, **options)
+        self._count('dataset.bytes_read', data.nbytes)
+        if selection is not None:
+            return with_byteorder(data, byteorder)
         locked = self.attrs.lock()
         self.attrs[f"{name}/dtype"]       = str(data.dtype)
         self.attrs[f"{name}/shape"]       = data.shape
         self.attrs[f"{name}/byteorder"]   = self._byteorders[data.dtype.byteorder]
         if locked == True:
             self.attrs.commit()
-        return data
-
-    def put_dataset(self, name, value, overwrite=True):
-        """puts `value` to this entry with `name`."""
-        if name in self.dataset_names():
+        if (cache is not None) and (byteorder is None) \
+                and data.flags.writeable and (not isinstance(data, _np.memmap)):
+            cache.put(key, signature, data)
+        return with_byteorder(data, byteorder)
+
+    def put_dataset(self, name, value, overwrite=True, **options):
+        """puts `value` to this entry with `name`.
+
+        any keyword `options` are passed to the `_store_child_dataset`
+        implementation of the interface (e.g. `chunks` for ChunkedZInterface).
+
+        in the durable mode, an existing dataset is not deleted beforehand,
+        so that it is kept intact unless the new one is successfully stored
+        (and, for the file system-based interfaces, until the new one is committed
+        along with its attributes upon `flush()`)."""
+        if self.has_dataset(name):
             if overwrite == False:
                 raise NameError(f"the dataset '{name}' already exists")
-            else:
+            elif self._rootobj.durable == False:
                 self.delete_dataset(name)
-        self._store_child_dataset(name, value)
+        self._discard_cached(f"{self._path}{SEP}{name}", subtree=False)
+        with self._span('dataset.store', path=f"{self._path}{SEP}{name}"):
+            self._put_child_dataset(name, value, **options)
+        self._count('dataset.bytes_written', value.nbytes)
         locked = self.attrs.lock()
         self.attrs[f"{name}/dtype"] = str(value.dtype)
         self.attrs[f"{name}/shape"] = value.shape
@@ -570,10 +1906,126 @@ class AbstractInterface:
         if locked == True:
             self.attrs.commit()
 
+    def append_dataset(self, name, value):
+        """appends `value` to the dataset `name` along its first axis.
+
+        `value` must have the shape of the existing dataset (without
+        or with the first axis), and its dtype must be safely castable
+        to that of the dataset. if the dataset does not exist yet,
+        it is created from `value`."""
+        value = _np.asarray(value)
+        if not self.has_dataset(name):
+            return self.put_dataset(name, value)
+        value, shape = self._appendable(name, value)
+        self._discard_cached(f"{self._path}{SEP}{name}", subtree=False)
+        with self._span('dataset.append', path=f"{self._path}{SEP}{name}"):
+            self._append_child_dataset(name, value)
+        self._count('dataset.bytes_written', value.nbytes)
+        self.attrs[f"{name}/shape"] = (shape[0] + value.shape[0],) + tuple(shape[1:])
+
+    def _appendable(self, name, value):
+        """checks that `value` can be appended to the existing dataset `name`.
+        returns `value` converted to the dtype and the shape of the rows of the dataset,
+        and the current shape of the dataset."""
+        dtype, shape = self._describe_child_dataset(name)
+        if len(shape) == 0:
+            raise ValueError(f"cannot append to a 0-dimensional dataset: {name}")
+        if value.shape == tuple(shape[1:]):
+            value = value[_np.newaxis]
+        if value.shape[1:] != tuple(shape[1:]):
+            raise ValueError(f"cannot append an array of shape {value.shape} to the dataset '{name}' of shape {tuple(shape)}")
+        if value.dtype != dtype:
+            if not _np.can_cast(value.dtype, dtype, casting='safe'):
+                raise ValueError(f"cannot append an array of dtype '{value.dtype}' to the dataset '{name}' of dtype '{dtype}'")
+            value = value.astype(dtype)
+        return value, shape
+
+    def _group_keypaths(self, keypaths, create=False):
+        """resolves each of `keypaths` and groups them by their direct parent.
+        returns a sequence of (parent, [(keypath, key), ...]) tuples."""
+        groups = _OrderedDict()
+        for keypath in keypaths:
+            parentpath, _, key = keypath.rpartition(SEP)
+            if parentpath not in groups.keys():
+                groups[parentpath] = (self.resolve_path(keypath, create=create)[0], [])
+            groups[parentpath][1].append((keypath, key))
+        return tuple(groups.values())
+
+    @staticmethod
+    def _batch_workers(workers=None):
+        return (_os.cpu_count() or 1) if workers is None else workers
+
+    def get_many(self, keypaths, workers=None, **options):
+        """returns an OrderedDict of (keypath, dataset) for all `keypaths`.
+
+        the paths are resolved once for each parent entry, and the datasets are
+        loaded in parallel on `workers` threads (the number of CPUs by default).
+        keyword `options` are passed to `get_dataset`."""
+        keypaths = tuple(keypaths)
+        tasks    = tuple((entry, keypath, key) for entry, items in self._group_keypaths(keypaths, create=False) \
+                                               for keypath, key in items)
+        def _load(task):
+            entry, keypath, key = task
+            return keypath, entry.get_dataset(key, **options)
+        loaded = dict(bounded_map(_load, tasks, self._batch_workers(workers)))
+        return _OrderedDict((keypath, loaded[keypath]) for keypath in keypaths)
+
+    def put_many(self, mapping, workers=None, overwrite=True, **options):
+        """puts each (keypath, value) in `mapping` as a dataset.
+
+        the datasets are stored in parallel on `workers` threads (the number of CPUs
+        by default), and the attributes of each parent entry are written once at the end.
+        keyword `options` are passed to `put_dataset`."""
+        for keypath, value in mapping.items():
+            if not isinstance(value, _np.ndarray):
+                raise ValueError(f"put_many() only accepts numpy arrays, but got {value.__class__} for {repr(keypath)}")
+        groups = self._group_keypaths(mapping.keys(), create=True)
+        tasks  = tuple((entry, key, mapping[keypath]) for entry, items in groups for keypath, key in items)
+        def _store(task):
+            entry, key, value = task
+            entry.put_dataset(key, value, overwrite=overwrite, **options)
+        for _ in bounded_map(_store, tasks, self._batch_workers(workers)):
+            pass
+        for entry, _ in groups:
+            entry._write_back()
+
+    def delete_many(self, keypaths, workers=None):
+        """deletes the entries and datasets specified by `keypaths`.
+
+        the datasets are deleted in parallel on `workers` threads (the number of CPUs
+        by default), and the attributes of each parent entry are written once at the end.
+        keypaths that fall under an entry being deleted are deleted along with the entry."""
+        groups   = self._group_keypaths(keypaths, create=False)
+        children = []
+        tasks    = []
+        for entry, items in groups:
+            for keypath, key in items:
+                if entry.has_child(key):
+                    children.append((entry, keypath, key))
+                elif entry.has_dataset(key):
+                    tasks.append((entry, keypath, key))
+                else:
+                    raise KeyError(keypath)
+        deleted  = tuple(f"{keypath}{SEP}" for _, keypath, _ in children)
+        children = [task for task in children if not task[1].startswith(deleted)]
+        tasks    = [task for task in tasks if not task[1].startswith(deleted)]
+        for entry, _, key in children:
+            if (entry._valid == True) and entry.has_child(key):
+                entry.delete_entry(key)
+        def _delete(task):
+            entry, _, key = task
+            if entry._valid == True:
+                entry.delete_dataset(key)
+        for _ in bounded_map(_delete, tasks, self._batch_workers(workers)):
+            pass
+        for entry, _ in groups:
+            if entry._valid == True:
+                entry._write_back()
+
     def put_namedtuple_struct(self, name, value, overwrite=True):
         if not is_namedtuple_struct(value):
             raise ValueError(f"not conforming to the 'named-tuple structure': {value.__class__}")
-        if name in self.child_names():
+        if self.has_child(name):
             if overwrite == False:
                 raise NameError(f"the entry '{name}' already exists")
             else:
@@ -591,24 +2043,118 @@ class AbstractInterface:
         if locked == True:
             entry.attrs.commit()
 
+    def _table_entry(self, name):
+        """returns the entry of the table `name`, and its (columns, rows) attributes."""
+        if not self.has_child(name):
+            raise NameError(f"table not found: {name}")
+        entry = self.get_entry(name, create=False)
+        if ('type' not in entry.attrs.keys()) or (entry.attrs['type'] != 'table'):
+            raise ValueError(f"the entry '{name}' is not a table")
+        return entry, tuple(entry.attrs['columns']), entry.attrs['rows']
+
+    def put_table(self, name, table, overwrite=True, **options):
+        """puts `table` (a structured array, or a mapping or a named tuple of arrays)
+        as the table `name`, i.e. a child entry with one dataset for each column.
+
+        the entry has the attributes `type` ('table'), `columns` (the names of
+        the columns in order) and `rows` (the number of rows shared by the columns).
+        keyword `options` are passed to `put_dataset` for each column
+        (e.g. `chunks` for ChunkedZInterface)."""
+        columns = table_columns(table)
+        if self.has_child(name):
+            if overwrite == False:
+                raise NameError(f"the entry '{name}' already exists")
+            else:
+                self.delete_entry(name)
+        entry  = self.get_entry(name, create=True)
+        locked = entry.attrs.lock()
+        for column, value in columns.items():
+            entry.put_dataset(column, value, overwrite=True, **options)
+        entry.attrs["type"]    = "table"
+        entry.attrs["columns"] = list(columns.keys())
+        entry.attrs["rows"]    = next(iter(columns.values())).shape[0]
+        if locked == True:
+            entry.attrs.commit()
+
+    def get_table(self, name, columns=None, rows=None, records=False):
+        """returns the table `name` as an OrderedDict of (column name, array).
+
+        only the datasets of `columns` (all of them by default) are read,
+        and only the part of them specified by `rows` (a slice, or all the rows by default).
+        if `records` is True, the columns are returned as one structured array instead."""
+        entry, names, nrows = self._table_entry(name)
+        if columns is None:
+            columns = names
+        else:
+            for column in columns:
+                if column not in names:
+                    raise NameError(f"column not found in the table '{name}': {column}")
+        if rows is None:
+            rows = slice(None)
+        if not isinstance(rows, slice):
+            raise ValueError(f"expected a slice of rows, got {rows.__class__}")
+        span      = range(nrows)[rows]
+        selection = slice(span.start, span.stop if span.stop >= 0 else None, span.step)
+        table = _OrderedDict((column, entry.get_dataset(column, selection=selection)) for column in columns)
+        if records == False:
+            return table
+        out = _np.empty(len(span), dtype=[(column, value.dtype, value.shape[1:]) for column, value in table.items()])
+        for column, value in table.items():
+            out[column] = value
+        return out
+
+    def append_table(self, name, table):
+        """appends the rows of `table` (see `put_table`) to the table `name`.
+        `table` must have the same columns as the table.
+        if the table does not exist yet, it is created from `table`.
+
+        all the columns are checked before any of them is appended, and
+        the `rows` attribute is updated after all the columns have been appended,
+        so that the rows that have been partially appended are not read by `get_table`."""
+        if not self.has_child(name):
+            return self.put_table(name, table)
+        columns = table_columns(table)
+        entry, names, nrows = self._table_entry(name)
+        if tuple(columns.keys()) != names:
+            if sorted(columns.keys()) != sorted(names):
+                raise ValueError(f"the columns {tuple(columns.keys())} do not match those of the table '{name}': {names}")
+        values = _OrderedDict()
+        for column in names:
+            values[column], shape = entry._appendable(column, _np.asarray(columns[column]))
+            if shape[0] != nrows:
+                raise ValueError(f"the column '{column}' of the table '{name}' has {shape[0]} rows (expected {nrows})")
+        counts = set(value.shape[0] for value in values.values())
+        if len(counts) > 1:
+            raise ValueError(f"the columns to be appended to the table '{name}' have different numbers of rows: {sorted(counts)}")
+        for column, value in values.items():
+            entry.append_dataset(column, value)
+        entry.attrs["rows"] = nrows + counts.pop()
+
     def delete_dataset(self, name):
         """deletes a child dataset with 'name' from this entry."""
+        self._discard_cached(f"{self._path}{SEP}{name}", subtree=False)
         self._delete_child_dataset(name)
 
         locked = self.attrs.lock()
-        del self.attrs[f"{name}/dtype"]
-        del self.attrs[f"{name}/shape"]
-        del self.attrs[f"{name}/byteorder"]
+        attrs  = self._info.get(name, None)
+        if is_mapping(attrs):
+            for attr in self._dataset_attrs:
+                if attr in attrs.keys():
+                    del self.attrs[f"{name}/{attr}"]
+            if len(attrs) == 0:
+                del self.attrs[name]
         if locked == True:
             self.attrs.commit()
 
     def get_dict(self, name):
-        return self._load_child_dict(name)
+        with self._span('dict.load', path=f"{self._path}{SEP}{name}"):
+            return self._load_child_dict(name)
 
     def put_dict(self, name, value):
         if not isinstance(value, (dict, _OrderedDict)): # FIXME: how to check if it is mapping type?
             raise ValueError(f"expected dict, got '{value.__class__}'")
-        self._store_child_dict(name, value)
+        with self._span('dict.store', path=f"{self._path}{SEP}{name}"):
+            self._store_child_dict(name, value)
 
     def delete_dict(self, name):
         self._delete_child_dict(name)
@@ -634,31 +2180,144 @@ class FileSystemInterface(AbstractInterface):
     - `_load_child_dataset`: to deserialize datasets into numpy.ndarrays.
     - `_store_child_dataset`: to serialize numpy.ndarrays.
 
+    the contents of each entry are indexed upon the first listing, and the
+    index is re-used as long as the modification time of the directory
+    stays the same. `_store_child_dataset` implementations should call
+    `_update_contents(name, dataset=True)` after writing a new dataset file,
+    so that the index does not have to be rebuilt.
+
+    if the root is opened with `consolidated=True`, the attributes and the
+    contents of all the entries are kept in a single (hidden) file at the root,
+    so that listing and attribute queries are answered without opening the file
+    of each entry. the consolidated metadata is updated along with the writes
+    through the root, and is written back upon `flush()`. modifications made
+    through the roots that are not opened in this mode are not reflected;
+    call `root.consolidate()` to re-build it from the whole tree.
+
+    if the root is opened with `shared=True`, multiple processes may write to
+    the same entries at a time: the attributes of each entry are written back by
+    merging the changes made by this process since they were loaded into those
+    in the file, while the entry is locked among the processes (see `ingest()`).
+
+    if the root is opened with `durable=True`, the files are not replaced when they are
+    written, but when the attributes are written back upon `flush()`: the new files are
+    synchronized to the disk all at once, and then replace the old ones through a journal
+    (see `_Staging`), so that a crash never leaves a dataset with the attributes of another
+    version (e.g. the `blocks` of BareZInterface). the files that are appended to are
+    modified in place, and are synchronized to the disk at the same time.
+
+    if the root is opened with `dedup=True`, the datasets with identical contents
+    (and dtype, shape and storage settings) are stored only once: the file of each
+    dataset is a hard link to the object in the (hidden) object store at the root,
+    which is identified by the hash of the dataset (kept as its `object` attribute).
+    the number of the links counts the references to each object, and the object is
+    removed when the last dataset that refers to it is deleted (see `collect_garbage()`).
+    the file of a dataset is copied before it is modified in place (i.e. when appended
+    to, or mapped with `mmap_mode='r+'`), so that the other datasets are not affected.
     """
 
     _meta_base   = "entry_metadata"
     _info_suffix = ".json"
     _data_suffix = None
+    _contents    = None # (mtime_ns, children, datasets)
+    _consolidated_name = ".consolidated_metadata.json"
+    consolidated = False
+    _catalog     = None  # path --> {'attrs', 'children', 'datasets'} (the root only)
+    _catalog_dirty = False
+    _lock_name   = ".entry_metadata.lock"
+    shared       = False
+    _bases       = None  # path --> the attributes as they were loaded (the root only)
+    _objects_name = ".objects"
+    dedup        = False
+    _dataset_attrs = AbstractInterface._dataset_attrs + ('object',)
+    _staging     = None  # _Staging (the root only, in the durable mode)
+    _released    = None  # the objects to be released after the commit (the root only)
 
     def _datafile(self, name):
         return self._repr / f"{name}{self._data_suffix}"
 
+    def _current(self, file):
+        """returns the file that holds the current contents of `file`
+        i.e. its replacement staged until the group commit (in the durable mode), or `file` itself."""
+        staging = self._rootobj._staging
+        return file if staging is None else staging.resolve(file)
+
+    def _current_datafile(self, name):
+        return self._current(self._datafile(name))
+
+    def _discard_file(self, file):
+        """removes `file` along with its staged replacement (if any)."""
+        staging = self._rootobj._staging
+        staged  = (staging is not None) and staging.discard(file)
+        try:
+            _os.unlink(file)
+        except FileNotFoundError:
+            if staged == False:
+                raise
+        self._sync_later(_os.path.dirname(file), directory=True)
+
+    @_contextlib.contextmanager
+    def _output(self, file, mode='wb', atomic=False, immediate=False):
+        """opens `file` to (re-)write it as a whole.
+
+        in the durable mode (or if `atomic` is True), the contents are written
+        to a temporary file, which replaces `file` atomically when the context exits
+        successfully, so that a crash never leaves `file` partially written.
+
+        in the durable mode, the temporary file is staged to replace `file` upon
+        the group commit along with the other files written until then (see `_Staging`),
+        and is read in place of `file` in the meantime. if `immediate` is True,
+        it is synchronized to the disk and replaces `file` when the context exits instead."""
+        file    = _pathlib.Path(file)
+        staging = self._rootobj._staging
+        if (staging is None) and (atomic == False):
+            with open(file, mode) as out:
+                yield out
+            return
+        if (staging is not None) and (immediate == False):
+            tmp = staging.tempfile(file)
+        else:
+            tmp = file.with_name(f".{file.name}.{_os.getpid()}-{_threading.get_ident()}.tmp")
+        try:
+            with open(tmp, mode) as out:
+                yield out
+                if (staging is not None) and (immediate == True):
+                    out.flush()
+                    _os.fsync(out.fileno())
+            if (staging is not None) and (immediate == False):
+                staging.stage(tmp, file)
+                return
+            _os.replace(tmp, file)
+        except BaseException:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+        self._sync_later(file.parent, directory=True)
+
     def _get_volatile_repr(self, parent, name):
         if parent is None:
             # root; necessary paths must have been already initialized
             return
         else:
             file = _pathlib.Path(parent._repr) / name
+            if (self._rootobj._catalog is not None) and (f"{parent._path}{SEP}{name}" in self._rootobj._catalog):
+                return file
 
         if file.is_file():
             raise FileExistsError("cannot create another entry (file in place of directory)")
         if not file.exists():
-            file.mkdir()
-            debug(f"FileSystemInterface._get_volatile_repr: created '{name}' under '{str(parent)}'")
+            try:
+                file.mkdir()
+            except FileExistsError:
+                pass # created by another process in the meantime
+            self._sync_later(file.parent, directory=True)
+            debug("FileSystemInterface._get_volatile_repr: created '{}' under '{}'", name, parent)
+            if isinstance(parent, FileSystemInterface):
+                parent._update_contents(name)
         return file
 
     def _load_child_dict(self, name):
-        dictfile = self._repr / f"{name}.json"
+        dictfile = self._current(self._repr / f"{name}.json")
         if not dictfile.exists():
             raise FileNotFoundError(str(dictfile))
         else:
@@ -666,88 +2325,582 @@ class FileSystemInterface(AbstractInterface):
                 return _json.load(src, object_hook=_OrderedDict)
 
     def _store_child_dict(self, name, value):
-        dictfile = self._repr / f"{name}.json"
-        with open(dictfile, 'w') as out:
+        with self._output(self._repr / f"{name}.json", 'w') as out:
             _json.dump(value, out, indent=4)
 
     def _delete_child_dict(self, name):
         dictfile = self._repr / f"{name}.json"
-        if dictfile.exists():
-            dictfile.unlink()
+        if self._current(dictfile).exists():
+            self._discard_file(dictfile)
+
+    def _catalog_entry(self):
+        """returns the consolidated metadata of this entry, or None if it is not available."""
+        catalog = self._rootobj._catalog
+        return None if catalog is None else catalog.get(self._path, None)
 
     def _load_info(self):
+        entry = self._catalog_entry()
+        if entry is not None:
+            self._info = _copy.deepcopy(entry['attrs'])
+            return
         infofile = self._repr / f"{self._meta_base}{self._info_suffix}"
+        if self._rootobj._catalog is not None:
+            # the entry is not consolidated yet
+            children, datasets = self._scan_directory(self._repr)
+            entry = {'attrs': self._read_info(infofile), 'children': children, 'datasets': datasets}
+            self._rootobj._catalog[self._path] = entry
+            self._rootobj._catalog_dirty       = True
+            self._info = _copy.deepcopy(entry['attrs'])
+            return
+        infofile = self._current(infofile)
         if not infofile.exists():
-            debug(f"FileSystemInterface._load_info: {repr(str(infofile))} was not found; leave the info empty.")
+            debug("FileSystemInterface._load_info: {!r} was not found; leave the info empty.", str(infofile))
             self._info = _OrderedDict()
         else:
             with open(infofile, 'r') as info:
                 self._info = _json.load(info, object_hook=_OrderedDict)
-            debug(f"FileSystemInterface._load_info: loaded from '{self._name}': '{self._info}'")
+            debug("FileSystemInterface._load_info: loaded from '{}': '{}'", self._name, self._info)
+        if self._rootobj._bases is not None:
+            self._rootobj._bases[self._path] = normalized(self._info)
+
+    @_contextlib.contextmanager
+    def _locked(self):
+        """holds the exclusive lock of this entry among the processes
+        (on a hidden lock file in the directory). it does nothing
+        on the platforms without `fcntl`."""
+        if _fcntl is None:
+            yield
+            return
+        with open(self._repr / self._lock_name, 'a') as lockfile:
+            _fcntl.flock(lockfile.fileno(), _fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                _fcntl.flock(lockfile.fileno(), _fcntl.LOCK_UN)
+
+    def _store_shared_info(self):
+        """merges the changes of the attributes since they were loaded
+        into those in the file, while the entry is locked."""
+        infofile = self._repr / f"{self._meta_base}{self._info_suffix}"
+        with self._locked():
+            base   = self._rootobj._bases.get(self._path, {})
+            merged = _merge_attrs(base, self._info, self._read_info(infofile))
+            with self._output(infofile, 'w', atomic=True, immediate=True) as out:
+                _json.dump(merged, out, indent=4)
+        self._info.clear()
+        self._info.update(merged)
+        self._rootobj._bases[self._path] = normalized(merged)
+        debug("FileSystemInterface._store_shared_info: merged into '{}': '{}'", self._name, self._info)
 
     def _store_info(self):
+        if self._rootobj._bases is not None:
+            return self._store_shared_info()
         if len(self._info) > 0:
-            with open(self._repr / f"{self._meta_base}{self._info_suffix}", 'w') as out:
+            with self._output(self._repr / f"{self._meta_base}{self._info_suffix}", 'w') as out:
                 _json.dump(self._info, out, indent=4)
-            debug(f"FileSystemInterface._store_info: stored into '{self._name}': '{self._info}'")
+            debug("FileSystemInterface._store_info: stored into '{}': '{}'", self._name, self._info)
+        entry = self._catalog_entry()
+        if entry is not None:
+            entry['attrs'] = _copy.deepcopy(self._info)
+            self._rootobj._catalog_dirty = True
 
     def _delete_info(self):
+        entry = self._catalog_entry()
+        if entry is not None:
+            entry['attrs'] = _OrderedDict()
+            self._rootobj._catalog_dirty = True
         infofile = self._repr / f"{self._meta_base}{self._info_suffix}"
-        if not infofile.exists():
+        if not self._current(infofile).exists():
             return
         else:
-            infofile.unlink()
+            self._discard_file(infofile)
+
+    def _read_info(self, infofile):
+        """returns the attributes in `infofile` (or empty ones, if it does not exist)."""
+        try:
+            with open(self._current(infofile), 'r') as info:
+                return _json.load(info, object_hook=_OrderedDict)
+        except FileNotFoundError:
+            return _OrderedDict()
+
+    def _scan_directory(self, directory):
+        """returns the (children, datasets) tuple of OrderedDicts in `directory`."""
+        children = _OrderedDict()
+        datasets = _OrderedDict()
+        with self._span('scan', path=str(directory)), _os.scandir(directory) as entries:
+            for item in entries:
+                stem, suffix = _os.path.splitext(item.name)
+                if item.name.startswith('.'):
+                    # hidden
+                    pass
+                elif suffix == self._info_suffix:
+                    # info
+                    pass
+                elif suffix == self._data_suffix:
+                    # data
+                    datasets[stem] = None
+                else:
+                    # child
+                    children[item.name] = None
+        if self._rootobj._staging is not None:
+            # the datasets that are created, but not committed yet
+            for name in self._rootobj._staging.staged_names(directory):
+                stem, suffix = _os.path.splitext(name)
+                if suffix == self._data_suffix:
+                    datasets[stem] = None
+        self._count('scan.items', len(children) + len(datasets))
+        return children, datasets
+
+    def _scan_contents(self):
+        """builds the index of the contents from the directory."""
+        stamp              = _os.stat(self._repr).st_mtime_ns
+        children, datasets = self._scan_directory(self._repr)
+        self._contents     = (stamp, children, datasets)
+        debug("FileSystemInterface._scan_contents: indexed '{}' ({} children, {} datasets)", self._name, len(children), len(datasets))
+
+    def _get_contents(self):
+        """returns the (up-to-date) index of the contents as
+        the (mtime_ns, children, datasets) tuple."""
+        entry = self._catalog_entry()
+        if entry is not None:
+            return (None, entry['children'], entry['datasets'])
+        if self._contents is not None:
+            if _os.stat(self._repr).st_mtime_ns == self._contents[0]:
+                return self._contents
+        self._scan_contents()
+        return self._contents
+
+    def _update_contents(self, name, dataset=False, present=True):
+        """updates the index of the contents in place, after
+        this interface added (`present=True`) or removed (`present=False`)
+        the child entry or dataset (`dataset=True`) `name`."""
+        entry = self._catalog_entry()
+        if entry is not None:
+            table = entry['datasets'] if dataset == True else entry['children']
+            if present == True:
+                table[name] = None
+            else:
+                table.pop(name, None)
+                if dataset == False:
+                    self._discard_catalog(f"{self._path}{SEP}{name}")
+            self._rootobj._catalog_dirty = True
+        if self._contents is None:
+            return
+        _, children, datasets = self._contents
+        table = datasets if dataset == True else children
+        if present == True:
+            table[name] = None
+        else:
+            table.pop(name, None)
+        self._contents = (_os.stat(self._repr).st_mtime_ns, children, datasets)
 
     def _list_contents(self, children=True, datasets=True):
+        _, _children, _datasets = self._get_contents()
         _listed = []
-        for path in self._repr.iterdir():
-            if path.name.startswith('.'):
-                # hidden
-                pass
-            elif path.suffix == self._info_suffix:
-                # info
-                pass
-            elif path.suffix == self._data_suffix:
-                # data
-                if datasets == True:
-                    _listed.append(path.stem)
-            else:
-                # child
-                if children == True:
-                    _listed.append(path.name)
+        if children == True:
+            _listed.extend(_children.keys())
+        if datasets == True:
+            _listed.extend(_datasets.keys())
         return tuple(_listed)
 
+    def has_child(self, name):
+        return name in self._get_contents()[1]
+
+    def has_dataset(self, name):
+        return name in self._get_contents()[2]
+
     def _get_child_entry(self, name):
         return self.__class__(name, parent=self)
 
+    def _attribute_index_file(self):
+        return self._rootobj._repr / ".attribute_index.sqlite3"
+
+    def _walk_contents(self, path):
+        """refers to the live entry or the consolidated metadata if available,
+        and otherwise scans the directory without instantiating the entry."""
+        root = self._rootobj
+        live = root if path == '' else root._entries.get(path, None)
+        if (live is not None) and (live._valid == True):
+            _, children, datasets = live._get_contents()
+            return live._info, children, datasets
+        if (root._catalog is not None) and (path in root._catalog):
+            entry = root._catalog[path]
+            return entry['attrs'], entry['children'], entry['datasets']
+        directory          = root._repr.joinpath(*path.split(SEP)[1:])
+        children, datasets = self._scan_directory(directory)
+        return self._read_info(directory / f"{self._meta_base}{self._info_suffix}"), children, datasets
+
+    def _dataset_signature(self, name):
+        stat = self._current_datafile(name).stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
     def _delete_child_entry(self, name, child):
         child._repr.rmdir()
+        self._sync_later(self._repr, directory=True)
+        self._update_contents(name, present=False)
 
     @abstractmethod
-    def _load_child_dataset(self, name):
+    def _load_child_dataset(self, name, **options):
         """tries to get the specified child dataset in this entry.
         it must return the corresponding numpy.ndarray object."""
         pass
 
     @abstractmethod
-    def _store_child_dataset(self, name, value):
+    def _store_child_dataset(self, name, value, **options):
         """stores `value` with the specified `name` (with appropriate
         suffix, if you use the `_data_suffix` functionality)."""
         pass
 
+    def _copy_contents(self, source, link=False):
+        """copies the files of the datasets directly, if `source`
+        is of the same interface type as this entry."""
+        if type(source) is not type(self):
+            return super()._copy_contents(source, link=link)
+        # the objects that the overwritten datasets refer to
+        previous = dict((dataname, self._dataset_object(dataname)) for dataname in source.dataset_names() \
+                        if self.has_dataset(dataname))
+        for key, value in source._info.items():
+            self._info[key] = _copy.deepcopy(value)
+        self._mark_dirty()
+        dedup = (self._rootobj.dedup == True)
+        for dataname in source.dataset_names():
+            digest = self._dataset_object(dataname) if dedup == True else None
+            if (digest is None) or (self._link_object(dataname, digest) is None):
+                # (replaces the file as a whole, i.e. never writes through a linked object)
+                self._copy_file(source._current_datafile(dataname), self._datafile(dataname), link=link)
+                if digest is not None:
+                    self._publish_object(dataname, digest)
+            self._update_contents(dataname, dataset=True)
+            self._sync_later(self._repr, directory=True)
+            if (previous.get(dataname, None) is not None) and (previous[dataname] != digest):
+                self._release_object(previous[dataname])
+        for grandchild in source.child_names():
+            self.put_entry(grandchild, source.get_entry(grandchild, create=False), link=link)
+
+    def delete_entry(self, name):
+        """deletes a child entry with 'name' from this entry.
+
+        the directory of the child entry is removed as a whole, without
+        instantiating the entries or updating the attributes in the subtree.
+        the live entry objects and the pending attributes in the subtree are discarded."""
+        if not self.has_child(name):
+            raise NameError(f"entry '{name}' does not exist")
+        path    = f"{self._path}{SEP}{name}"
+        digests = set()
+        if self._rootobj.dedup == True:
+            for item in self.get_entry(name, create=False).walk():
+                if (item.kind == 'dataset') and ('object' in item.attrs.keys()):
+                    digests.add(item.attrs['object'])
+        self._discard_subtree(path)
+        if self._rootobj._staging is not None:
+            self._rootobj._staging.discard_tree(self._repr / name)
+        _shutil.rmtree(self._repr / name) # walks the tree with os.scandir
+        for digest in digests:
+            self._release_object(digest)
+        self._update_contents(name, present=False)
+        self._sync_later(self._repr, directory=True)
+        debug("FileSystemInterface.delete_entry: removed '{}' from '{}'", name, self._name)
+
+    def _object_file(self, digest):
+        return self._rootobj._repr / self._objects_name / digest[:2] / f"{digest[2:]}{self._data_suffix}"
+
+    def _object_sidecar(self, digest):
+        """returns the file that keeps the interface-specific attributes of the object `digest`."""
+        return self._object_file(digest).with_name(f"{digest[2:]}.json")
+
+    def _object_settings(self, options):
+        """returns the settings that affect how a dataset is stored, for `_object_digest`."""
+        return dict(options)
+
+    def _object_digest(self, value, options):
+        """returns the hash of `value` (along with its dtype and shape, and
+        the storage settings) that identifies it in the object store."""
+        header = _json.dumps([self.__class__.__name__, str(value.dtype), list(value.shape),
+                              sorted((key, repr(item)) for key, item in self._object_settings(options).items())])
+        digest = _hashlib.blake2b(header.encode('utf-8'), digest_size=20)
+        for block in iter_byteblocks(value, 1 << 22):
+            digest.update(block)
+        return digest.hexdigest()
+
+    def _object_attrs(self, name):
+        """returns the interface-specific attributes of the dataset `name` (e.g. `blocks`)."""
+        attrs = _OrderedDict()
+        for attr in self._dataset_attrs:
+            if (attr not in FileSystemInterface._dataset_attrs) and (attr in self._info.get(name, {})):
+                attrs[attr] = self._info[name][attr]
+        return attrs
+
+    def _dataset_object(self, name):
+        """returns the object that the dataset `name` refers to, or None."""
+        try:
+            return self.attrs[f"{name}/object"]
+        except (KeyError, TypeError):
+            return None
+
+    def _link_object(self, name, digest):
+        """makes the file of the dataset `name` a hard link to the object `digest`,
+        and returns the interface-specific attributes of the object.
+        returns None if the object is not in the store."""
+        datafile = self._datafile(name)
+        objfile  = self._object_file(digest)
+        staging  = self._rootobj._staging
+        if staging is None:
+            tmp  = datafile.with_name(f".{datafile.name}.{_os.getpid()}-{_threading.get_ident()}.link")
+        else:
+            tmp  = staging.tempfile(datafile, 'link')
+        attrs    = self._read_info(self._object_sidecar(digest))
+        if (len(attrs) == 0) and (len(self._dataset_attrs) > len(FileSystemInterface._dataset_attrs)):
+            return None # the attributes are required but lost
+        if staging is not None:
+            objfile = staging.source(objfile) # i.e. the object to be published upon the commit
+        try:
+            current = self._current(datafile)
+            if _os.path.exists(current) and _os.path.samefile(objfile, current):
+                return attrs # already linked
+            _os.link(objfile, tmp)
+        except FileNotFoundError:
+            return None
+        if staging is not None:
+            staging.stage(tmp, datafile) # the object has been synchronized upon its own commit
+            return attrs
+        try:
+            _os.replace(tmp, datafile)
+        finally:
+            # `tmp` remains if `datafile` has been linked to the object in the meantime
+            if _os.path.lexists(tmp):
+                _os.unlink(tmp)
+        self._sync_later(self._repr, directory=True)
+        return attrs
+
+    def _publish_object(self, name, digest):
+        """adds the file of the dataset `name` to the object store as `digest`."""
+        objfile = self._object_file(digest)
+        objfile.parent.mkdir(parents=True, exist_ok=True)
+        attrs   = self._object_attrs(name)
+        if len(attrs) > 0:
+            with self._output(self._object_sidecar(digest), 'w', atomic=True) as out:
+                _json.dump(attrs, out)
+        datafile = self._current_datafile(name)
+        if self._rootobj._staging is not None:
+            # i.e. not until the contents have been synchronized
+            self._rootobj._staging.link_later(datafile, objfile)
+            return
+        try:
+            _os.link(datafile, objfile)
+        except FileExistsError:
+            pass # published by another process in the meantime
+
+    def _release_object(self, digest, references=0):
+        """removes the object `digest` if no more than `references` datasets refer to it."""
+        objfile = self._object_file(digest)
+        try:
+            if objfile.stat().st_nlink > references + 1:
+                if self._rootobj._staging is not None:
+                    # the replaced links are only removed upon the commit
+                    self._rootobj._released.add(digest)
+                return
+            objfile.unlink()
+        except FileNotFoundError:
+            return
+        sidecar = self._object_sidecar(digest)
+        if sidecar.exists():
+            sidecar.unlink()
+        self._sync_later(objfile.parent, directory=True)
+
+    def _detach_object(self, name):
+        """makes the file of the dataset `name` private, so that it can be modified in place.
+        the object is removed rather than copied, if the dataset is the only one that refers to it."""
+        digest = self._dataset_object(name)
+        if self._rootobj._staging is not None:
+            self._rootobj._staging.discard_links(self._current_datafile(name))
+        if digest is not None:
+            del self.attrs[f"{name}/object"]
+            try:
+                shared = _os.path.samefile(self._object_file(digest), self._current_datafile(name))
+            except FileNotFoundError:
+                shared = False
+            self._release_object(digest, references=1 if shared == True else 0)
+        self._unshare_datafile(name)
+
+    def _put_child_dataset(self, name, value, **options):
+        """stores the dataset `name`, deduplicating it in the dedup mode."""
+        if (self._rootobj.dedup == False) or value.dtype.hasobject:
+            return self._store_child_dataset(name, value, **options)
+        previous = self._dataset_object(name)
+        digest   = self._object_digest(value, options)
+        attrs    = self._link_object(name, digest)
+        locked   = self.attrs.lock()
+        if attrs is not None:
+            for key, item in attrs.items():
+                self.attrs[f"{name}/{key}"] = item
+            self._update_contents(name, dataset=True)
+            self._count('dataset.dedup_hits')
+            self._count('dataset.dedup_bytes', value.nbytes)
+        else:
+            self._store_child_dataset(name, value, **options)
+            self._publish_object(name, digest)
+        self.attrs[f"{name}/object"] = digest
+        if locked == True:
+            self.attrs.commit()
+        if (previous is not None) and (previous != digest):
+            self._release_object(previous)
+
+    def collect_garbage(self):
+        """removes the objects in the object store that no dataset refers to
+        (e.g. after the files were removed outside of the root).
+        returns the number of the removed objects."""
+        store   = self._rootobj._repr / self._objects_name
+        removed = 0
+        if not store.exists():
+            return removed
+        for directory in store.iterdir():
+            for file in tuple(directory.iterdir()):
+                if file.name.startswith('.'):
+                    continue # being written
+                try:
+                    if file.suffix == '.json':
+                        if not file.with_name(f"{file.stem}{self._data_suffix}").exists():
+                            file.unlink()
+                    elif file.stat().st_nlink == 1:
+                        self._release_object(f"{directory.name}{file.stem}")
+                        removed += 1
+                except FileNotFoundError:
+                    pass # removed along with its object
+        debug("FileSystemInterface.collect_garbage: removed {} objects", removed)
+        return removed
+
+    def _unshare_datafile(self, name):
+        """replaces the file of the dataset `name` with its private copy,
+        if it is hard-linked from elsewhere (so that it can be modified in place)."""
+        file = self._current_datafile(name)
+        if file.stat().st_nlink > 1:
+            self._copy_file(file, self._datafile(name)) # i.e. replaced with a new copy
+
+    def _copy_file(self, src, dst, link=False):
+        """copies `src` to replace `dst` (see `copy_file`), or stages the copy
+        to replace `dst` upon the group commit in the durable mode."""
+        staging = self._rootobj._staging
+        if staging is None:
+            copy_file(src, dst, link=link)
+            self._sync_later(_os.path.dirname(dst), directory=True)
+            return
+        tmp = staging.tempfile(dst, 'copy')
+        try:
+            _copy_into(src, tmp, link)
+        except BaseException:
+            if _os.path.lexists(tmp):
+                _os.unlink(tmp)
+            raise
+        staging.stage(tmp, dst)
+
+    def append_dataset(self, name, value):
+        if self.has_dataset(name):
+            self._detach_object(name)
+        super().append_dataset(name, value)
+
     def _delete_child_dataset(self, name):
         """removes the dataset that has `name` (with appropriate suffix,
         if you use the `_data_suffix` functionality)."""
-        self._datafile(name).unlink()
+        self._discard_file(self._datafile(name))
+        self._update_contents(name, dataset=True, present=False)
+        digest = self._dataset_object(name)
+        if digest is not None:
+            del self.attrs[f"{name}/object"]
+            self._release_object(digest)
+
+    def _discard_catalog(self, path):
+        """removes the consolidated metadata of the entries at or under `path`."""
+        catalog = self._rootobj._catalog
+        for key in tuple(catalog.keys()):
+            if (key == path) or key.startswith(path + SEP):
+                del catalog[key]
+
+    def consolidate(self):
+        """(re-)builds the consolidated metadata by walking the whole tree,
+        and writes it to the root. the root is switched to the `consolidated` mode."""
+        if not self.is_root():
+            raise ValueError("consolidate() not applied to the root object")
+        self.flush()
+        catalog = _OrderedDict()
+        stack   = [('', self._repr)]
+        while len(stack) > 0:
+            path, directory    = stack.pop()
+            children, datasets = self._scan_directory(directory)
+            attrs              = self._read_info(directory / f"{self._meta_base}{self._info_suffix}")
+            catalog[path]      = {'attrs': attrs, 'children': children, 'datasets': datasets}
+            stack.extend((f"{path}{SEP}{name}", directory / name) for name in reversed(children))
+        self.consolidated   = True
+        self._catalog       = catalog
+        self._catalog_dirty = True
+        self._write_catalog()
+        debug("FileSystemInterface.consolidate: {} entries in '{}'", len(catalog), self._repr)
+
+    def _load_catalog(self):
+        catalogfile = self._current(self._repr / self._consolidated_name)
+        if not catalogfile.exists():
+            return self.consolidate()
+        with open(catalogfile, 'r') as src:
+            entries = _json.load(src, object_hook=_OrderedDict)['entries']
+        for entry in entries.values():
+            entry['children'] = _OrderedDict.fromkeys(entry['children'])
+            entry['datasets'] = _OrderedDict.fromkeys(entry['datasets'])
+        self._catalog = entries
+
+    def _write_catalog(self):
+        entries = _OrderedDict((path, {'attrs': entry['attrs'],
+                                       'children': list(entry['children'].keys()),
+                                       'datasets': list(entry['datasets'].keys())}) \
+                               for path, entry in self._catalog.items())
+        with self._output(self._repr / self._consolidated_name, 'w', atomic=True) as out:
+            _json.dump({'version': 1, 'entries': entries}, out)
+        self._catalog_dirty = False
+
+    def _sync_pending(self):
+        """commits the staged files along with the other registered paths in the durable mode
+        (see `_Staging`), and then removes the objects that are no more referred to."""
+        root = self._rootobj
+        if (root._staging is None) or (len(root._staging) == 0):
+            return super()._sync_pending()
+        unsynced, root._unsynced = root._unsynced, _OrderedDict()
+        with self._span('sync', paths=len(unsynced) + len(root._staging)):
+            root._staging.commit(files=(path for path, isdir in unsynced.items() if isdir == False),
+                                 directories=(path for path, isdir in unsynced.items() if isdir == True))
+        released, root._released = root._released, set()
+        for digest in released:
+            self._release_object(digest)
+        debug("FileSystemInterface._sync_pending: committed {} paths", len(unsynced))
+
+    def _write_back_root(self):
+        """writes back the consolidated metadata, if it is in use."""
+        root = self._rootobj
+        if (root._catalog is not None) and (root._catalog_dirty == True):
+            root._write_catalog()
+
+    @classmethod
+    def open(cls, rootpath, **kwargs):
+        root = super().open(rootpath, **kwargs)
+        if root.durable == True:
+            root._staging   = _Staging(root._repr)
+            root._released  = set()
+            root._finalizer.detach()
+            root._finalizer = _weakref.finalize(root, _flush_pending, root._pending, root._staging)
+        if root.shared == True:
+            if root.consolidated == True:
+                raise ValueError("the consolidated metadata cannot be used with shared=True")
+            root._bases = {'': normalized(root._info)}
+        if root.consolidated == True:
+            root._load_catalog()
+        return root
 
     @classmethod
     def _open_root_repr(cls, rootpath):
         rootrepr = _pathlib.Path(rootpath)
         if not rootrepr.exists():
             created = True
-            rootrepr.mkdir(parents=True)
+            rootrepr.mkdir(parents=True, exist_ok=True) # may be created by another process
         else:
             created = False
+            _Staging.recover(rootrepr) # the commit interrupted in the durable mode (if any)
         return created, rootrepr
 
     @classmethod
@@ -756,40 +2909,1193 @@ class FileSystemInterface(AbstractInterface):
 
 
 class NPYInterface(FileSystemInterface):
+    """the file system-based interface that stores each dataset as a NPY file.
+
+    datasets can be read as memory-mapped arrays (numpy.memmap) instead of
+    being loaded into memory. the mode is set either for the whole tree
+    e.g. by `NPYInterface.open(rootpath, mmap_mode='r')`, or for each call
+    e.g. by `entry.get_dataset(name, mmap_mode='c')`:
+
+    - `'r'`: read-only mapping.
+    - `'c'`: copy-on-write mapping (changes are kept in memory, and never
+      written back to the file).
+    - `'r+'`: read-write mapping (changes are written back to the file).
+    - `None`: no mapping i.e. the dataset is loaded into memory (default).
+
+    because mapped arrays are backed by the page cache of the OS, processes
+    mapping the same dataset share their physical memory.
+    """
     _data_suffix = '.npy'
+    _mmap_modes  = ('r', 'r+', 'c')
+    mmap_mode    = None
 
     def __init__(self, name, parent=None):
         super().__init__(name, parent=parent)
-
-    def _load_child_dataset(self, name):
-        data = _np.load(str(self._datafile(name)))
+        if parent is not None:
+            if hasattr(parent, 'mmap_mode'):
+                self.mmap_mode = parent.mmap_mode
+
+    def _load_child_dataset(self, name, mmap_mode=None):
+        """loads the dataset `name`.
+
+        `mmap_mode` overrides the `mmap_mode` attribute of this entry
+        for this call; pass `False` to force loading into memory."""
+        if mmap_mode is None:
+            mmap_mode = self.mmap_mode
+        if (mmap_mode is None) or (mmap_mode == False):
+            mmap_mode = None
+        elif mmap_mode not in self._mmap_modes:
+            raise ValueError(f"unsupported mmap_mode: {repr(mmap_mode)} (expected one of {self._mmap_modes})")
+        if mmap_mode == 'r+':
+            self._detach_object(name)
+        data = _np.load(str(self._current_datafile(name)), mmap_mode=mmap_mode)
         return data
 
+    def _read_header(self, src):
+        """reads the NPY header from the file object `src`.
+        returns (dtype, shape, fortran_order, offset), or None
+        if the file format version is not supported."""
+        version = _np.lib.format.read_magic(src)
+        if version == (1, 0):
+            shape, fortran_order, dtype = _np.lib.format.read_array_header_1_0(src)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = _np.lib.format.read_array_header_2_0(src)
+        else:
+            return None
+        return dtype, shape, fortran_order, src.tell()
+
+    def _append_child_dataset(self, name, value):
+        """writes `value` after the last row of the file, and
+        then patches the shape in the NPY header in place.
+
+        the whole file is re-written only if the new header
+        does not fit in the space of the old one."""
+        self._sync_later(self._current_datafile(name))
+        with open(self._current_datafile(name), 'r+b') as dst:
+            header = self._read_header(dst)
+            if header is not None:
+                dtype, shape, fortran_order, offset = header
+            if (header is None) or (fortran_order == True) or dtype.hasobject:
+                return super()._append_child_dataset(name, value)
+
+            newshape = (shape[0] + value.shape[0],) + tuple(shape[1:])
+            dst.seek(0)
+            major, _ = _np.lib.format.read_magic(dst)
+            prefix   = dst.tell() + (2 if major == 1 else 4) # the size of the header-length field
+            newdict  = {'descr': _np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': newshape}
+            newhead  = repr(newdict).replace('}', ', }')
+            space    = offset - prefix - 1 # the last one is for '\n'
+            if len(newhead) > space:
+                return super()._append_child_dataset(name, value)
+
+            # write the data first, so that the existing header remains valid upon failure
+            rowsize = dtype.itemsize
+            for length in shape[1:]:
+                rowsize *= length
+            dst.seek(offset + shape[0] * rowsize)
+            dst.write(byteview(value))
+            dst.truncate()
+            dst.seek(prefix)
+            dst.write((newhead + ' ' * (space - len(newhead)) + '\n').encode('latin1'))
+
+    def _describe_child_dataset(self, name):
+        try:
+            return parse_dtype(self.attrs[f"{name}/dtype"]), tuple(self.attrs[f"{name}/shape"])
+        except (KeyError, TypeError):
+            pass
+        with open(self._current_datafile(name), 'rb') as src:
+            header = self._read_header(src)
+        if header is None:
+            return super()._describe_child_dataset(name)
+        return header[0], tuple(header[1])
+
+    def _load_child_region(self, name, selection, mmap_mode=None):
+        """reads the rows of the dataset `name` that contain `selection`
+        directly from the file, or slices the memory-mapped dataset
+        if `mmap_mode` is in effect."""
+        if mmap_mode is None:
+            mmap_mode = self.mmap_mode
+        if (mmap_mode is not None) and (mmap_mode != False):
+            return self._load_child_dataset(name, mmap_mode=mmap_mode)[selection]
+
+        with open(self._current_datafile(name), 'rb') as src:
+            header = self._read_header(src)
+            if header is not None:
+                dtype, shape, fortran_order, offset = header
+            if (header is None) or (fortran_order == True) or (len(shape) == 0) or dtype.hasobject:
+                # falls back to reading through the whole dataset
+                return self._load_child_dataset(name, mmap_mode=False)[selection]
+
+            bounds, relative = selection_bounds(selection, shape)
+            start, stop = bounds[0]
+            rowsize     = dtype.itemsize
+            for length in shape[1:]:
+                rowsize *= length
+            rows = _np.empty((stop - start,) + tuple(shape[1:]), dtype=dtype)
+            src.seek(offset + start * rowsize)
+            if src.readinto(byteview(rows)) != rows.nbytes:
+                raise IOError(f"unexpected end of file: {self._datafile(name)}")
+        box = rows[(slice(None),) + tuple(slice(lo, hi) for lo, hi in bounds[1:])]
+        return box[relative]
+
     def _store_child_dataset(self, name, value):
-        _np.save(str(self._datafile(name)), value)
+        with self._output(self._datafile(name), 'wb') as out:
+            _np.save(out, value)
+        self._update_contents(name, dataset=True)
+
+def _shuffle_encode(block, dtype):
+    if dtype.itemsize <= 1:
+        return block
+    return _np.ascontiguousarray(block.reshape(-1, dtype.itemsize).T).reshape(-1)
+
+def _shuffle_decode(block, dtype, rawsize):
+    if dtype.itemsize <= 1:
+        return block
+    return _np.ascontiguousarray(block.reshape(dtype.itemsize, -1).T).reshape(-1)
+
+def _bitshuffle_encode(block, dtype):
+    bits = _np.unpackbits(block.reshape(-1, dtype.itemsize), axis=1, bitorder='little')
+    return _np.packbits(_np.ascontiguousarray(bits.T), axis=1, bitorder='little').reshape(-1)
+
+def _bitshuffle_decode(block, dtype, rawsize):
+    count = rawsize // dtype.itemsize
+    bits  = _np.unpackbits(block.reshape(dtype.itemsize * 8, -1), axis=1, count=count, bitorder='little')
+    return _np.packbits(_np.ascontiguousarray(bits.T), axis=1, bitorder='little').reshape(-1)
+
+def _delta_type(dtype):
+    """the unsigned integer type (with the matching byte order) used for delta encoding."""
+    if dtype.itemsize not in (1, 2, 4, 8):
+        return _np.dtype('u1')
+    return _np.dtype(f"{'>' if dtype.byteorder == '>' else '<' if dtype.byteorder == '<' else '='}u{dtype.itemsize}")
+
+def _delta_encode(block, dtype):
+    values = block.view(_delta_type(dtype))
+    delta  = _np.empty_like(values)
+    delta[:1] = values[:1]
+    _np.subtract(values[1:], values[:-1], out=delta[1:])
+    return delta.view(_np.uint8)
+
+def _delta_decode(block, dtype, rawsize):
+    delta  = block.view(_delta_type(dtype))
+    values = _np.empty_like(delta)
+    _np.cumsum(delta, out=values)
+    return values.view(_np.uint8)
+
+def _optional_compressors():
+    """yields (name, compress, decompress) of the third-party compressors that are installed."""
+    try:
+        import zstandard as _zstd
+        yield 'zstd', \
+              (lambda data, level: _zstd.ZstdCompressor(level=max(1, level)).compress(data)), \
+              (lambda data, rawsize: _zstd.ZstdDecompressor().decompress(data, max_output_size=rawsize))
+    except ImportError:
+        pass
+    try:
+        import lz4.frame as _lz4
+        yield 'lz4', \
+              (lambda data, level: _lz4.compress(data, compression_level=max(0, level))), \
+              (lambda data, rawsize: _lz4.decompress(data))
+    except ImportError:
+        pass
 
-class BareZInterface(FileSystemInterface):
-    _data_suffix = ".zarr"
+COMPRESSORS = _OrderedDict() # name --> (compress(data, level), decompress(data, rawsize))
+FILTERS     = _OrderedDict() # name --> (encode(block, dtype), decode(block, dtype, rawsize))
+
+def register_compressor(name, compress, decompress):
+    """registers a compressor to be used in Codec.
+
+    `compress(data, level)` must return the compressed bytes of the buffer `data`,
+    and `decompress(data, rawsize)` must return the `rawsize` bytes restored from `data`."""
+    COMPRESSORS[name] = (compress, decompress)
+
+def register_filter(name, encode, decode):
+    """registers a filter to be used in Codec.
+
+    `encode(block, dtype)` receives the flat uint8 array `block` that contains the items
+    of `dtype`, and must return the filtered flat uint8 array (without modifying `block`).
+    `decode(block, dtype, rawsize)` must restore the `rawsize` bytes from the filtered `block`."""
+    FILTERS[name] = (encode, decode)
+
+register_compressor('zlib',
+                    (lambda data, level: _zlib.compress(data, level)),
+                    (lambda data, rawsize: _zlib.decompress(data, bufsize=max(1, rawsize))))
+register_compressor('bz2',
+                    (lambda data, level: _bz2.compress(data, min(9, max(1, level)))),
+                    (lambda data, rawsize: _bz2.decompress(data)))
+register_compressor('lzma',
+                    (lambda data, level: _lzma.compress(data, preset=min(9, max(0, level)))),
+                    (lambda data, rawsize: _lzma.decompress(data)))
+for _name, _compress, _decompress in _optional_compressors():
+    register_compressor(_name, _compress, _decompress)
+
+register_filter('shuffle',    _shuffle_encode,    _shuffle_decode)
+register_filter('bitshuffle', _bitshuffle_encode, _bitshuffle_decode)
+register_filter('delta',      _delta_encode,      _delta_decode)
+
+class Codec:
+    """the pipeline of `filters` followed by `compression`, used to encode
+    blocks of datasets in the compressed interfaces.
+
+    the available filters are those in FILTERS ('shuffle' (byte-shuffle),
+    'bitshuffle' and 'delta' by default), and they are applied in the given order
+    upon encoding. the available compressors are those in COMPRESSORS ('zlib', 'bz2',
+    'lzma', and 'zstd' and 'lz4' if the corresponding packages are installed).
+
+    the time and the bytes of (de)coding are recorded to `instrumentation` (if not None)."""
+    def __init__(self, compression='zlib', filters=(), level=6, instrumentation=None):
+        if compression not in COMPRESSORS.keys():
+            raise ValueError(f"unknown compression: '{compression}' (expected one of {tuple(COMPRESSORS.keys())})")
+        for name in filters:
+            if name not in FILTERS.keys():
+                raise ValueError(f"unknown filter: '{name}' (expected one of {tuple(FILTERS.keys())})")
+        self.compression = compression
+        self.filters     = tuple(filters)
+        self.level       = level
+        self.instrumentation = instrumentation
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(compression={repr(self.compression)}, filters={self.filters}, level={self.level})"
+
+    def _record(self, rawsize, encodedsize):
+        if self.instrumentation is not None:
+            self.instrumentation.count('codec.raw_bytes', rawsize)
+            self.instrumentation.count('codec.encoded_bytes', encodedsize)
+
+    def encode(self, block, dtype):
+        """encodes the flat uint8 array `block` that contains the items of `dtype`."""
+        rawsize = block.size
+        with _span(self.instrumentation, 'codec.encode'):
+            for name in self.filters:
+                block = FILTERS[name][0](block, dtype)
+            data = COMPRESSORS[self.compression][0](block, self.level)
+        self._record(rawsize, len(data))
+        return data
+
+    def decode(self, data, dtype, rawsize):
+        """decodes `data` into a flat uint8 array of `rawsize` bytes."""
+        with _span(self.instrumentation, 'codec.decode'):
+            block = _np.frombuffer(COMPRESSORS[self.compression][1](data, rawsize), dtype=_np.uint8)
+            for name in reversed(self.filters):
+                block = FILTERS[name][1](block, dtype, rawsize)
+        if block.size != rawsize:
+            raise IOError(f"unexpected size of a decoded block ({block.size} != {rawsize} bytes)")
+        self._record(rawsize, len(data))
+        return block
+
+class CompressedInterface(FileSystemInterface):
+    """base class for the file system-based interfaces that compress datasets.
+
+    the codec is set either for the whole tree e.g. by
+    `open(rootpath, compression='lzma', filters=('delta', 'shuffle'), compression_level=9)`,
+    or for each dataset e.g. by `entry.put_dataset(name, value, compression='bz2')`.
+    the codec of each dataset is stored in its `compression` and `filters` attributes,
+    so that it is decoded accordingly. see Codec for the available filters and compressors.
+
+    the (de)compression runs in parallel on `workers` threads,
+    which is set e.g. by `open(rootpath, workers=8)`.
+    """
+    _default_compression       = 'zlib'
     _default_compression_level = 6
+    _default_workers           = 1
+    _dataset_attrs    = FileSystemInterface._dataset_attrs + ('compression', 'filters')
+    compression       = None
     compression_level = None
+    filters           = None
+    workers           = None
 
     def __init__(self, name, parent=None):
         super().__init__(name, parent=parent)
         if parent is not None:
+            if hasattr(parent, 'compression'):
+                self.compression = parent.compression
             if hasattr(parent, 'compression_level'):
                 self.compression_level = parent.compression_level
+            if hasattr(parent, 'filters'):
+                self.filters = parent.filters
+            if hasattr(parent, 'workers'):
+                self.workers = parent.workers
+        if self.compression is None:
+            self.compression = self._default_compression
         if self.compression_level is None:
             self.compression_level = self._default_compression_level
+        if self.filters is None:
+            self.filters = ()
+        if self.workers is None:
+            self.workers = self._default_workers
+
+    def _new_codec(self, compression=None, filters=None):
+        """returns the Codec for a new dataset, with the settings of this entry
+        being overridden by `compression` and `filters` (if not None)."""
+        return Codec(compression=self.compression if compression is None else compression,
+                     filters=self.filters if filters is None else filters,
+                     level=self.compression_level,
+                     instrumentation=self._rootobj.instrumentation)
+
+    def _dataset_codec(self, name):
+        """returns the Codec of the existing dataset `name`."""
+        try:
+            filters = self.attrs[f"{name}/filters"]
+        except KeyError:
+            filters = ()
+        return Codec(compression=self.attrs[f"{name}/compression"],
+                     filters=filters,
+                     level=self.compression_level,
+                     instrumentation=self._rootobj.instrumentation)
+
+    def _object_settings(self, options):
+        settings = dict(compression=self.compression, compression_level=self.compression_level,
+                        filters=list(self.filters))
+        settings.update(options)
+        return settings
+
+    def _record_codec(self, name, codec):
+        self.attrs[f"{name}/compression"] = codec.compression
+        self.attrs[f"{name}/filters"]     = codec.filters
+
+class BareZInterface(CompressedInterface):
+    """the file system-based interface that stores each dataset as compressed streams.
+
+    each dataset is split into blocks of approximately `_block_size` bytes,
+    and the blocks are encoded independently (see CompressedInterface for the codecs).
+    the (raw size, compressed size) of the blocks are stored as the `blocks`
+    attribute of the dataset, and appending to a dataset adds new blocks.
+
+    the blocks are compressed and decompressed in parallel on `workers` threads,
+    which is set e.g. by `BareZInterface.open(rootpath, workers=8)`.
+    at most `2 * workers` blocks are held in memory in addition to the array itself.
+
+    datasets without the `blocks` attribute (i.e. those written by the older
+    versions of stappy) are decompressed sequentially as a (series of) zlib stream(s),
+    in pieces of `_stream_block_size` bytes."""
+    _data_suffix = ".zarr"
+    _dataset_attrs    = CompressedInterface._dataset_attrs + ('blocks',)
+    _block_size                = 1 << 22
+    _stream_block_size         = 1 << 20
+
+    def _write_blocks(self, dst, value, codec):
+        """encodes `value` block by block using `codec`, and writes them to
+        the file object `dst`. returns the list of (raw size, compressed size)."""
+        blocksize = max(1, self._block_size // max(1, value.dtype.itemsize)) * max(1, value.dtype.itemsize)
+        blocks    = []
+        def _encode(block):
+            return block.size, codec.encode(block, value.dtype)
+        for rawsize, binary in bounded_map(_encode,
+                                           iter_byteblocks(value, blocksize),
+                                           self.workers):
+            dst.write(binary)
+            blocks.append([rawsize, len(binary)])
+        return blocks
+
+    def _read_blocks(self, src, view, blocks, codec, dtype):
+        """decodes the `blocks` read from the file object `src`
+        into the flat uint8 array `view`."""
+        def _compressed():
+            rawoffset = 0
+            for rawsize, size in blocks:
+                yield rawoffset, rawsize, src.read(size)
+                rawoffset += rawsize
+        def _decompress(task):
+            rawoffset, rawsize, binary = task
+            view[rawoffset:rawoffset + rawsize] = codec.decode(binary, dtype, rawsize)
+        for _ in bounded_map(_decompress, _compressed(), self.workers):
+            pass
+
+    def _compress_into(self, dst, value):
+        """writes `value` to the file object `dst` as a zlib stream."""
+        stream = _zlib.compressobj(self.compression_level)
+        for block in iter_byteblocks(value, self._stream_block_size):
+            dst.write(stream.compress(block))
+        dst.write(stream.flush())
+
+    def _decompress_into(self, src, view):
+        """decompresses the zlib stream(s) from the file object `src`
+        into the flat uint8 array `view`."""
+        pos    = 0
+        stream = _zlib.decompressobj()
+        while True:
+            data = src.read(self._stream_block_size)
+            if len(data) == 0:
+                break
+            while len(data) > 0:
+                piece = stream.decompress(data, self._stream_block_size)
+                if pos + len(piece) > view.size:
+                    raise IOError(f"the decompressed data exceeds the size of the dataset ({view.size} bytes)")
+                view[pos:pos + len(piece)] = _np.frombuffer(piece, dtype=_np.uint8)
+                pos += len(piece)
+                if stream.eof:
+                    # the next stream (appended) may follow
+                    data   = stream.unused_data
+                    stream = _zlib.decompressobj()
+                else:
+                    data   = stream.unconsumed_tail
+        if pos != view.size:
+            raise IOError(f"the decompressed data is shorter than the dataset ({pos} < {view.size} bytes)")
+
+    def _load_child_dataset(self, name):
+        dtype = parse_dtype(self.attrs[f"{name}/dtype"])
+        shape = self.attrs[f"{name}/shape"]
+        data  = _np.empty(shape, dtype=dtype)
+        try:
+            blocks = self.attrs[f"{name}/blocks"]
+        except KeyError:
+            blocks = None
+        with open(self._current_datafile(name), 'rb') as src:
+            if blocks is None:
+                self._decompress_into(src, byteview(data))
+            else:
+                self._read_blocks(src, byteview(data), blocks, self._dataset_codec(name), dtype)
+        return data
+
+    def _store_child_dataset(self, name, value, compression=None, filters=None):
+        codec = self._new_codec(compression=compression, filters=filters)
+        with self._output(self._datafile(name), 'wb') as dst:
+            blocks = self._write_blocks(dst, value, codec)
+        locked = self.attrs.lock()
+        self._record_codec(name, codec)
+        self.attrs[f"{name}/blocks"]      = blocks
+        if locked == True:
+            self.attrs.commit()
+        self._update_contents(name, dataset=True)
+
+    def _append_child_dataset(self, name, value):
+        """appends `value` as new blocks (or as another zlib stream, for
+        datasets without the `blocks` attribute) at the end of the file."""
+        try:
+            blocks = self.attrs[f"{name}/blocks"]
+        except KeyError:
+            blocks = None
+        self._sync_later(self._current_datafile(name))
+        with open(self._current_datafile(name), 'ab') as dst:
+            if blocks is None:
+                self._compress_into(dst, value)
+            else:
+                self.attrs[f"{name}/blocks"] = blocks + self._write_blocks(dst, value, self._dataset_codec(name))
+
+class ChunkedZInterface(CompressedInterface):
+    """the file system-based interface that stores each dataset as
+    a set of separately compressed chunks (see CompressedInterface for the codecs).
+
+    the dataset is split on a grid of chunks, and each chunk is compressed
+    independently. the compressed chunks are concatenated in one file, and
+    the chunk grid and the (offset, size) index of the chunks are stored
+    in the entry attributes. reading a part of a dataset
+    (e.g. by `entry.get_dataset(name, selection=...)`) only decompresses
+    the chunks that overlap with the selection.
+
+    the chunks are compressed and decompressed in parallel on `workers` threads,
+    which is set e.g. by `ChunkedZInterface.open(rootpath, workers=8)`.
+
+    the chunk shape is set either for the whole tree
+    e.g. by `ChunkedZInterface.open(rootpath, chunk_shape=(1024, None))`,
+    or for each dataset e.g. by `entry.put_dataset(name, value, chunks=(256,))`.
+    `None` (or -1) in the chunk shape means the whole length of the axis.
+    the tree-wide chunk shape applies to the leading axes of each dataset.
+    if the chunk shape is not specified, the dataset is chunked along its
+    first axis, so that each chunk has approximately `_default_chunk_bytes` bytes.
+    """
+    _data_suffix = ".zchunks"
+    _dataset_attrs    = CompressedInterface._dataset_attrs + ('chunks', 'chunk_index')
+    _default_chunk_bytes       = 1 << 20
+    chunk_shape       = None
+
+    def __init__(self, name, parent=None):
+        super().__init__(name, parent=parent)
+        if parent is not None:
+            if hasattr(parent, 'chunk_shape'):
+                self.chunk_shape = parent.chunk_shape
+
+    def _resolve_chunks(self, shape, itemsize, chunks=None):
+        """returns the chunk shape to be used for an array of `shape`.
+
+        the tree-wide `chunk_shape` applies to the leading axes of the array
+        (and the remaining axes are not split), whereas `chunks` specified
+        for the dataset must match its dimensionality."""
+        if (chunks is None) and (self.chunk_shape is not None):
+            chunks = tuple(self.chunk_shape)[:len(shape)]
+            chunks = chunks + (None,) * (len(shape) - len(chunks))
+        if chunks is None:
+            if len(shape) == 0:
+                return ()
+            rowsize = itemsize
+            for size in shape[1:]:
+                rowsize *= size
+            rows = max(1, self._default_chunk_bytes // max(1, rowsize))
+            return (max(1, min(shape[0], rows)),) + tuple(max(1, size) for size in shape[1:])
+        else:
+            chunks = tuple(chunks)
+            if len(chunks) != len(shape):
+                raise ValueError(f"chunk shape {chunks} does not match the dimensionality of the dataset shape {tuple(shape)}")
+            return tuple(max(1, size if (chunk is None) or (chunk < 0) else chunk) \
+                         for chunk, size in zip(chunks, shape))
+
+    @staticmethod
+    def _chunk_grid(shape, chunks):
+        return tuple(-(-size // chunk) for size, chunk in zip(shape, chunks))
+
+    def _chunk_layout(self, name):
+        """returns (dtype, shape, chunks, grid, index) for the dataset `name`."""
+        dtype  = parse_dtype(self.attrs[f"{name}/dtype"])
+        shape  = tuple(self.attrs[f"{name}/shape"])
+        chunks = tuple(self.attrs[f"{name}/chunks"])
+        index  = self.attrs[f"{name}/chunk_index"]
+        return dtype, shape, chunks, self._chunk_grid(shape, chunks), index
+
+    def _read_box(self, name, bounds):
+        """reads the box of the dataset `name`, specified by
+        the (start, stop) `bounds` of each axis."""
+        dtype, shape, chunks, grid, index = self._chunk_layout(name)
+        codec = self._dataset_codec(name)
+        out = _np.empty(tuple(stop - start for start, stop in bounds), dtype=dtype)
+        if out.size == 0:
+            return out
+        spans = tuple(range(start // chunk, (stop - 1) // chunk + 1) \
+                      for (start, stop), chunk in zip(bounds, chunks))
+
+        def _compressed(src):
+            # reads the overlapping chunks sequentially
+            for pos in _np.ndindex(*(len(span) for span in spans)):
+                gridpos = tuple(span[i] for span, i in zip(spans, pos))
+                offset, nbytes = index[int(_np.ravel_multi_index(gridpos, grid))] if len(grid) > 0 else index[0]
+                src.seek(offset)
+                yield gridpos, src.read(nbytes)
+
+        def _decompress(task):
+            gridpos, binary = task
+            origin  = tuple(i * chunk for i, chunk in zip(gridpos, chunks))
+            extent  = tuple(min(chunk, size - o) for chunk, size, o in zip(chunks, shape, origin))
+            rawsize = dtype.itemsize
+            for length in extent:
+                rawsize *= length
+            block   = codec.decode(binary, dtype, rawsize).view(dtype).reshape(extent)
+            srcsel  = []
+            dstsel  = []
+            for o, e, (start, stop) in zip(origin, extent, bounds):
+                lo = max(o, start)
+                hi = min(o + e, stop)
+                srcsel.append(slice(lo - o, hi - o))
+                dstsel.append(slice(lo - start, hi - start))
+            out[tuple(dstsel)] = block[tuple(srcsel)]
+
+        with open(self._current_datafile(name), 'rb') as src:
+            for _ in bounded_map(_decompress, _compressed(src), self.workers):
+                pass
+        return out
 
     def _load_child_dataset(self, name):
-        dtype = _np.dtype(self.attrs[f"{name}/dtype"])
         shape = self.attrs[f"{name}/shape"]
-        file  = str(self._datafile(name))
-        with open(file, 'rb') as src:
-            binary = _zlib.decompress(src.read())
-        return _np.frombuffer(binary, dtype=dtype).reshape(shape, order='C')
+        return self._read_box(name, tuple((0, size) for size in shape))
+
+    def _load_child_region(self, name, selection):
+        bounds, relative = selection_bounds(selection, tuple(self.attrs[f"{name}/shape"]))
+        return self._read_box(name, bounds)[relative]
+
+    def _write_chunks(self, dst, value, chunks, offset, codec):
+        """encodes `value` chunk by chunk using `codec`, and writes them to `dst`
+        starting at `offset`. returns the index of the written chunks."""
+        def _blocks():
+            for gridpos in _np.ndindex(*self._chunk_grid(value.shape, chunks)):
+                # (`Ellipsis` keeps a 0-d `value` as an array, i.e. in its byte order)
+                yield value[tuple(slice(i * chunk, (i + 1) * chunk) for i, chunk in zip(gridpos, chunks)) or Ellipsis]
+        def _compress(block):
+            return codec.encode(byteview(block), value.dtype)
+        index = []
+        for binary in bounded_map(_compress, _blocks(), self.workers):
+            dst.write(binary)
+            index.append([offset, len(binary)])
+            offset += len(binary)
+        return index
+
+    def _store_child_dataset(self, name, value, chunks=None, compression=None, filters=None):
+        chunks = self._resolve_chunks(value.shape, value.dtype.itemsize, chunks=chunks)
+        codec  = self._new_codec(compression=compression, filters=filters)
+        with self._output(self._datafile(name), 'wb') as dst:
+            index = self._write_chunks(dst, value, chunks, 0, codec)
+        locked = self.attrs.lock()
+        self._record_codec(name, codec)
+        self.attrs[f"{name}/chunks"]      = chunks
+        self.attrs[f"{name}/chunk_index"] = index
+        if locked == True:
+            self.attrs.commit()
+        self._update_contents(name, dataset=True)
+
+    def _append_child_dataset(self, name, value):
+        """writes the new rows as new chunks at the end of the file.
+
+        if the last row of chunks is not filled up, these chunks are
+        re-compressed together with the new rows (the space of
+        the old chunks is left unused in the file)."""
+        dtype, shape, chunks, grid, index = self._chunk_layout(name)
+        start = (shape[0] // chunks[0]) * chunks[0] # the first row of the partial chunks
+        if start < shape[0]:
+            head  = self._read_box(name, ((start, shape[0]),) + tuple((0, size) for size in shape[1:]))
+            block = _np.empty((head.shape[0] + value.shape[0],) + head.shape[1:], dtype=dtype)
+            block[:head.shape[0]] = head
+            block[head.shape[0]:] = value
+            value = block
+            index = index[:(start // chunks[0]) * (len(index) // grid[0])]
+        self._sync_later(self._current_datafile(name))
+        with open(self._current_datafile(name), 'ab') as dst:
+            index = index + self._write_chunks(dst, value, chunks, dst.tell(), self._dataset_codec(name))
+        self.attrs[f"{name}/chunk_index"] = index
+
+class PackFile:
+    """the single file that holds a whole tree for PackInterface.
+
+    the file consists of a header and the records that are only ever appended.
+    each record consists of its description in JSON and its payload (the bytes
+    of the dataset, or the JSON of the info or the dict). the payloads are
+    aligned to `align` bytes, so that the datasets can be mapped into memory
+    as numpy arrays. a record that puts or deletes an item supersedes
+    the earlier records for the same item.
+
+    the index of the live records is kept in memory. when the file is closed,
+    the index is written as a record by itself, followed by a trailer that
+    points to it, so that it is loaded without scanning the file next time.
+    if the file has not been closed properly, the index is rebuilt by replaying
+    the records (a truncated record at the end of the file is discarded).
+
+    the only exception to appending records is `extend_dataset`: the last record
+    of the file is extended in place, by writing the new payload after the current one
+    and then updating the description (so that an interrupted extension is discarded).
+    """
+    magic    = b"STAPPACK"
+    version  = 1
+    align    = 64
+    _record  = b"STAPREC\0"
+    _trailer = b"STAPTAIL"
+    _rechead = _struct.Struct("<8sIIQ") # tag, description size, (reserved), payload size
+    _tailfmt = _struct.Struct("<8sQ")   # tag, offset of the index record
+    _block_size = 1 << 22
+
+    def __init__(self, path):
+        self.path    = _pathlib.Path(path)
+        self._lock   = _threading.RLock()
+        self._map    = None
+        self._index  = _OrderedDict([('', self._new_entry())]) # path --> entry
+        self._dead   = 0    # the bytes of payloads that have been superseded
+        self._tail   = None # the offset of the trailer, to be overwritten by the next record
+        self._dirty  = False
+        self.created = not self.path.exists()
+        if self.created == True:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'w+b')
+            self._file.write(self._pad(self.magic + _struct.pack("<I", self.version)))
+            self._file.flush()
+            self._dirty = True
+        else:
+            self._file = open(self.path, 'r+b')
+            self._load_index()
+
+    def __str__(self):
+        return str(self.path)
+
+    @staticmethod
+    def _new_entry():
+        return _OrderedDict([('info', None),
+                             ('children', _OrderedDict()),
+                             ('datasets', _OrderedDict()), # name --> [offset, nbytes, descr, shape]
+                             ('dicts', _OrderedDict())])   # name --> [offset, nbytes]
+
+    def _aligned(self, size):
+        return size + (-size % self.align)
+
+    def _pad(self, data):
+        return data + b'\0' * (-len(data) % self.align)
+
+    def _read_record(self, offset, filesize):
+        """returns (description, payload offset, payload size) of the record at `offset`,
+        or None if there is no (complete) record."""
+        self._file.seek(offset)
+        head = self._file.read(self._rechead.size)
+        if len(head) < self._rechead.size:
+            return None
+        tag, descsize, _, paysize = self._rechead.unpack(head)
+        if tag != self._record:
+            return None
+        try:
+            desc = _json.loads(self._file.read(descsize).decode('utf-8'))
+        except ValueError:
+            return None
+        payload = offset + self._aligned(self._rechead.size + descsize)
+        if payload + paysize > filesize:
+            return None
+        return desc, payload, paysize
+
+    def _load_index(self):
+        filesize = self._file.seek(0, 2)
+        self._file.seek(0)
+        if not self._file.read(len(self.magic)) == self.magic:
+            raise ValueError(f"not a pack file: {self.path}")
+        if filesize >= 2 * self.align:
+            self._file.seek(filesize - self.align)
+            tag, offset = self._tailfmt.unpack(self._file.read(self._tailfmt.size))
+            record = self._read_record(offset, filesize) if tag == self._trailer else None
+            if (record is not None) and (record[0]['kind'] == 'index'):
+                desc, payload, paysize = record
+                self._file.seek(payload)
+                snapshot    = _json.loads(self._file.read(paysize).decode('utf-8'), object_hook=_OrderedDict)
+                self._index = snapshot['entries']
+                self._dead  = snapshot['dead']
+                self._tail  = filesize - self.align
+                return
+        self._replay(filesize)
+
+    def _replay(self, filesize):
+        """rebuilds the index by reading through the records."""
+        position = self.align
+        while position < filesize:
+            self._file.seek(position)
+            if self._file.read(len(self._trailer)) == self._trailer:
+                position += self.align
+                continue
+            record = self._read_record(position, filesize)
+            if record is None:
+                break
+            desc, payload, paysize = record
+            self._apply(desc, payload, paysize)
+            position = payload + self._aligned(paysize)
+        if position < filesize:
+            debug("PackFile._replay: discarded {} bytes at the end of '{}'", filesize - position, self.path)
+            self._file.truncate(position)
+        self._dirty = True
+
+    def _apply(self, desc, offset, nbytes):
+        """updates the index with the record."""
+        kind = desc['kind']
+        if kind == 'index':
+            self._dead += nbytes
+            return
+        path = desc['path']
+        if kind == 'entry':
+            parent, name = path.rsplit(SEP, 1)
+            if desc['op'] == 'put':
+                if path not in self._index:
+                    self._index[path] = self._new_entry()
+                    self._index[parent]['children'][name] = None
+            else:
+                self._index[parent]['children'].pop(name, None)
+                self._drop_entry(path)
+            return
+        entry = self._index[path]
+        if kind == 'info':
+            old = entry['info']
+            entry['info'] = [offset, nbytes] if desc['op'] == 'put' else None
+        else:
+            old = entry[kind].pop(desc['name'], None)
+            if desc['op'] == 'put':
+                item = [offset, nbytes]
+                if kind == 'datasets':
+                    item.extend((desc['dtype'], desc['shape']))
+                entry[kind][desc['name']] = item
+        if old is not None:
+            self._dead += old[1]
+
+    def _drop_entry(self, path):
+        entry = self._index.pop(path, None)
+        if entry is None:
+            return
+        for name in entry['children'].keys():
+            self._drop_entry(f"{path}{SEP}{name}")
+        if entry['info'] is not None:
+            self._dead += entry['info'][1]
+        for item in tuple(entry['datasets'].values()) + tuple(entry['dicts'].values()):
+            self._dead += item[1]
+
+    def _append(self, desc, payload=(), paysize=0):
+        """appends a record, and returns the offset of it.
+        `payload` is an iterable of bytes-like objects, `paysize` bytes in total."""
+        with self._lock:
+            encoded = _json.dumps(desc).encode('utf-8')
+            if self._tail is not None:
+                position, self._tail = self._tail, None
+            else:
+                position = self._aligned(self._file.seek(0, 2))
+            self._file.seek(position)
+            self._file.write(self._pad(self._rechead.pack(self._record, len(encoded), 0, paysize) + encoded))
+            offset  = self._file.tell()
+            written = 0
+            for block in payload:
+                written += self._file.write(block)
+            if written != paysize:
+                raise ValueError(f"expected {paysize} bytes of payload, got {written}")
+            self._file.write(b'\0' * (-paysize % self.align))
+            self._file.truncate()
+            self._file.flush()
+            self._dirty = True
+            self._apply(desc, offset, paysize)
+            return position
+
+    def _view(self, offset, nbytes):
+        """returns the read-only memoryview of the file at `offset`."""
+        with self._lock:
+            if (self._map is None) or (len(self._map) < offset + nbytes):
+                # the old mapping stays alive as long as the arrays refer to it
+                self._map = _mmap.mmap(self._file.fileno(), 0, access=_mmap.ACCESS_READ)
+            return memoryview(self._map)[offset:offset + nbytes]
+
+    def _load_json(self, item):
+        return _json.loads(bytes(self._view(*item[:2])).decode('utf-8'), object_hook=_OrderedDict)
+
+    def _store_json(self, desc, value):
+        encoded = _json.dumps(value).encode('utf-8')
+        self._append(desc, (encoded,), len(encoded))
+
+    @property
+    def dead_bytes(self):
+        """the number of bytes occupied by the superseded payloads."""
+        return self._dead
+
+    def entry(self, path):
+        """returns the index of the entry at `path`."""
+        return self._index[path]
+
+    def put_entry(self, path):
+        with self._lock:
+            if path not in self._index:
+                self._append({'op': 'put', 'kind': 'entry', 'path': path})
+
+    def delete_entry(self, path):
+        self._append({'op': 'delete', 'kind': 'entry', 'path': path})
+
+    def load_info(self, path):
+        item = self._index[path]['info']
+        return _OrderedDict() if item is None else self._load_json(item)
+
+    def store_info(self, path, info):
+        self._store_json({'op': 'put', 'kind': 'info', 'path': path}, info)
+
+    def delete_info(self, path):
+        if self._index[path]['info'] is not None:
+            self._append({'op': 'delete', 'kind': 'info', 'path': path})
+
+    def load_dict(self, path, name):
+        item = self._index[path]['dicts'].get(name, None)
+        if item is None:
+            raise FileNotFoundError(f"{self.path}:{path}{SEP}{name}")
+        return self._load_json(item)
+
+    def store_dict(self, path, name, value):
+        self._store_json({'op': 'put', 'kind': 'dicts', 'path': path, 'name': name}, value)
+
+    def delete_dict(self, path, name):
+        if name in self._index[path]['dicts']:
+            self._append({'op': 'delete', 'kind': 'dicts', 'path': path, 'name': name})
+
+    def describe_dataset(self, path, name):
+        """returns the (dtype, shape) tuple of the dataset."""
+        _, _, descr, shape = self._index[path]['datasets'][name]
+        return _np.lib.format.descr_to_dtype(descr), tuple(shape)
+
+    def load_dataset(self, path, name):
+        """returns the dataset as a read-only array mapped from the file."""
+        offset, nbytes, _, _ = self._index[path]['datasets'][name]
+        dtype, shape = self.describe_dataset(path, name)
+        if nbytes == 0:
+            data = _np.empty(shape, dtype=dtype)
+            data.flags.writeable = False
+            return data
+        return _np.frombuffer(self._view(offset, nbytes), dtype=dtype).reshape(shape)
+
+    @staticmethod
+    def _dataset_desc(path, name, descr, shape):
+        return {'op': 'put', 'kind': 'datasets', 'path': path, 'name': name,
+                'dtype': descr, 'shape': list(shape)}
+
+    def store_dataset(self, path, name, value):
+        if value.dtype.hasobject:
+            raise ValueError(f"cannot store the dataset of object dtype: {name}")
+        desc = self._dataset_desc(path, name, _np.lib.format.dtype_to_descr(value.dtype), value.shape)
+        self._append(desc, iter_byteblocks(value, self._block_size), value.nbytes)
+
+    def extend_dataset(self, path, name, value, sync=False):
+        """appends `value` (of the dtype of the dataset) to the dataset along its first axis,
+        by extending its record in place. returns False (without modifying the file)
+        if the record is not the last one in the file.
+
+        if `sync` is True, the new payload is synchronized to the disk
+        before the description is updated."""
+        with self._lock:
+            item = self._index[path]['datasets'][name]
+            offset, nbytes, descr, shape = item
+            olddesc = _json.dumps(self._dataset_desc(path, name, descr, shape)).encode('utf-8')
+            newshape = [shape[0] + value.shape[0]] + list(shape[1:])
+            encoded  = _json.dumps(self._dataset_desc(path, name, descr, newshape)).encode('utf-8')
+            headsize = self._aligned(self._rechead.size + len(olddesc))
+            end      = self._file.seek(0, 2) if self._tail is None else self._tail
+            if (offset + self._aligned(nbytes) != end) \
+                    or (self._aligned(self._rechead.size + len(encoded)) != headsize):
+                return False
+            self._file.seek(offset + nbytes)
+            for block in iter_byteblocks(value, self._block_size):
+                self._file.write(block)
+            self._file.write(b'\0' * (-(nbytes + value.nbytes) % self.align))
+            self._file.truncate()
+            self._file.flush()
+            if sync == True:
+                _os.fsync(self._file.fileno())
+            self._file.seek(offset - headsize)
+            self._file.write(self._pad(self._rechead.pack(self._record, len(encoded), 0, nbytes + value.nbytes) + encoded))
+            self._file.flush()
+            self._tail  = None
+            self._dirty = True
+            item[1]     = nbytes + value.nbytes
+            item[3]     = newshape
+            return True
+
+    def delete_dataset(self, path, name):
+        self._append({'op': 'delete', 'kind': 'datasets', 'path': path, 'name': name})
+
+    def compact(self):
+        """re-writes the file only with the live records, and returns
+        the number of bytes that have been reclaimed."""
+        with self._lock:
+            before = self._file.seek(0, 2)
+            tmp    = self.path.with_name(f".{self.path.name}.compact")
+            if tmp.exists():
+                tmp.unlink()
+            packed = PackFile(tmp)
+            for path, entry in self._index.items():
+                if path != '':
+                    packed.put_entry(path)
+                if entry['info'] is not None:
+                    packed._append({'op': 'put', 'kind': 'info', 'path': path},
+                                   (self._view(*entry['info']),), entry['info'][1])
+                for name, (offset, nbytes, descr, shape) in entry['datasets'].items():
+                    desc = self._dataset_desc(path, name, descr, shape)
+                    packed._append(desc, (self._view(offset, nbytes),), nbytes)
+                for name, (offset, nbytes) in entry['dicts'].items():
+                    packed._append({'op': 'put', 'kind': 'dicts', 'path': path, 'name': name},
+                                   (self._view(offset, nbytes),), nbytes)
+            packed.close(sync=True)
+            self._map = None
+            self._file.close()
+            _os.replace(tmp, self.path)
+            self._file  = open(self.path, 'r+b')
+            self._index = packed._index
+            self._dead  = 0
+            self._dirty = False
+            after       = self._file.seek(0, 2)
+            self._tail  = after - self.align
+            debug("PackFile.compact: '{}' {} --> {} bytes", self.path, before, after)
+            return before - after
+
+    def close(self, sync=False):
+        """writes the index and the trailer, and closes the file.
+        if `sync` is True, the file is also synchronized to the disk."""
+        with self._lock:
+            if self._file is None:
+                return
+            if self._dirty == True:
+                snapshot = _json.dumps({'entries': self._index, 'dead': self._dead}).encode('utf-8')
+                offset   = self._append({'op': 'put', 'kind': 'index'}, (snapshot,), len(snapshot))
+                self._file.write(self._pad(self._tailfmt.pack(self._trailer, offset)))
+                self._file.flush()
+            if sync == True:
+                _os.fsync(self._file.fileno())
+            self._map = None
+            self._file.close()
+            self._file = None
+
+class PackInterface(AbstractInterface):
+    """the interface that stores the whole tree in a single file (see `PackFile`).
+
+    the datasets are read from the memory-mapped file. by default, they are
+    copied into memory; with `mmap_mode='r'` (set for the whole tree upon `open()`,
+    or for each call of `get_dataset()`), read-only arrays backed by the mapped file
+    are returned without copying.
+
+    because the file is only appended to, the items that have been overwritten
+    or deleted leave unused space in the file. `root.compact()` re-writes the file
+    only with the live items. use `convert()` to convert the tree from/to
+    the other interfaces e.g. NPYInterface.
+    """
+    _mmap_modes = ('r',)
+    mmap_mode   = None
+
+    def __init__(self, name, parent=None):
+        super().__init__(name, parent=parent)
+        if parent is not None:
+            if hasattr(parent, 'mmap_mode'):
+                self.mmap_mode = parent.mmap_mode
+
+    @classmethod
+    def _open_root_repr(cls, rootpath):
+        rootrepr = PackFile(rootpath)
+        return rootrepr.created, rootrepr
+
+    @classmethod
+    def _free_root_repr(cls, rootrepr):
+        rootrepr.close()
+
+    def _get_volatile_repr(self, parent, name):
+        path = f"{parent._path}{SEP}{name}"
+        self._root.put_entry(path)
+        return path
+
+    def _load_info(self):
+        self._info = self._root.load_info(self._path)
+
+    def _store_info(self):
+        self._root.store_info(self._path, self._info)
+        debug("PackInterface._store_info: stored into '{}': '{}'", self._name, self._info)
+
+    def _delete_info(self):
+        self._root.delete_info(self._path)
+
+    def _list_contents(self, children=True, datasets=True):
+        entry   = self._root.entry(self._path)
+        _listed = []
+        if children == True:
+            _listed.extend(entry['children'].keys())
+        if datasets == True:
+            _listed.extend(entry['datasets'].keys())
+        return tuple(_listed)
+
+    def has_child(self, name):
+        return name in self._root.entry(self._path)['children']
+
+    def has_dataset(self, name):
+        return name in self._root.entry(self._path)['datasets']
+
+    def _get_child_entry(self, name):
+        return self.__class__(name, parent=self)
+
+    def _delete_child_entry(self, name, child):
+        self._root.delete_entry(child._path)
+
+    def delete_entry(self, name):
+        """deletes a child entry with 'name' from this entry.
+
+        the whole subtree is deleted by a single record, without instantiating
+        the entries in the subtree. the live entry objects and the pending
+        attributes in the subtree are discarded."""
+        if not self.has_child(name):
+            raise NameError(f"entry '{name}' does not exist")
+        path = f"{self._path}{SEP}{name}"
+        self._discard_subtree(path)
+        self._root.delete_entry(path)
+
+    def _mmap_mode(self, mmap_mode):
+        if mmap_mode is None:
+            mmap_mode = self.mmap_mode
+        if (mmap_mode is None) or (mmap_mode == False):
+            return None
+        elif mmap_mode not in self._mmap_modes:
+            raise ValueError(f"unsupported mmap_mode: {repr(mmap_mode)} (expected one of {self._mmap_modes})")
+        return mmap_mode
+
+    def _load_child_dataset(self, name, mmap_mode=None):
+        """loads the dataset `name`.
+
+        `mmap_mode` overrides the `mmap_mode` attribute of this entry
+        for this call; pass `False` to force loading into memory."""
+        data = self._root.load_dataset(self._path, name)
+        if self._mmap_mode(mmap_mode) is None:
+            data = data.copy()
+        return data
+
+    def _load_child_region(self, name, selection, mmap_mode=None):
+        """slices the mapped dataset, so that only the pages
+        that contain `selection` are read from the file."""
+        region = self._root.load_dataset(self._path, name)[selection]
+        if (self._mmap_mode(mmap_mode) is None) and (not region.flags.writeable):
+            region = region.copy()
+        return region
+
+    def _describe_child_dataset(self, name):
+        return self._root.describe_dataset(self._path, name)
+
+    def _dataset_signature(self, name):
+        return tuple(self._root.entry(self._path)['datasets'][name][:2]) # (offset, nbytes)
+
+    def _walk_contents(self, path):
+        live  = self._rootobj if path == '' else self._rootobj._entries.get(path, None)
+        entry = self._root.entry(path)
+        if (live is not None) and (live._valid == True):
+            attrs = live._info
+        else:
+            attrs = self._root.load_info(path)
+        return attrs, entry['children'], entry['datasets']
+
+    def _walk_describe(self, path, name, attrs):
+        return self._root.describe_dataset(path, name)
+
+    def _write_back_root(self):
+        """registers the pack file to be synchronized in the durable mode."""
+        self._sync_later(self._rootobj._root.path)
+        self._sync_later(self._rootobj._root.path.parent, directory=True)
+
+    def _attribute_index_file(self):
+        packpath = self._rootobj._root.path
+        return packpath.with_name(f".{packpath.name}.attrs.sqlite3")
 
     def _store_child_dataset(self, name, value):
-        self.attrs[f"{name}/compression"] = 'zlib'
-        with open(self._datafile(name), 'wb') as dst:
-            dst.write(_zlib.compress(value.tobytes(order='C'), level=self.compression_level))
+        self._root.store_dataset(self._path, name, value)
+
+    def _append_child_dataset(self, name, value):
+        """extends the record of the dataset in place if it is the last one in the file
+        (e.g. when the dataset is copied in blocks), or re-writes the whole dataset otherwise."""
+        if not self._root.extend_dataset(self._path, name, value, sync=self._rootobj.durable):
+            super()._append_child_dataset(name, value)
+
+    def _delete_child_dataset(self, name):
+        self._root.delete_dataset(self._path, name)
+
+    def _load_child_dict(self, name):
+        return self._root.load_dict(self._path, name)
+
+    def _store_child_dict(self, name, value):
+        self._root.store_dict(self._path, name, value)
+
+    def _delete_child_dict(self, name):
+        self._root.delete_dict(self._path, name)
+
+    def compact(self):
+        """writes back the pending attributes, and re-writes the pack file
+        only with the live items. returns the number of bytes reclaimed."""
+        if not self.is_root():
+            raise ValueError("compact() not applied to the root object")
+        self.flush()
+        return self._root.compact()
+
+def convert(src, cls, rootpath, link=False, **kwargs):
+    """copies the whole tree of the root `src` into the new root of
+    the interface `cls` at `rootpath` (opened with `kwargs`), and returns it.
+
+    e.g. `convert(NPYInterface.open("data"), PackInterface, "data.pack")`."""
+    dest = cls.open(rootpath, **kwargs)
+    dest.update(src, link=link)
+    return dest
+
+_ingest_root = None # the root of the worker process of `ingest()`
+
+def _ingest_init(cls, rootpath, kwargs):
+    global _ingest_root
+    _ingest_root = cls.open(rootpath, shared=True, **kwargs)
+
+def _ingest_item(item):
+    keypath, value = item
+    if callable(value):
+        value = value()
+    entry, name = _ingest_root.resolve_path(keypath, create=True)
+    entry.put_dataset(name, _np.asarray(value), overwrite=True)
+    _ingest_root.flush()
+    return keypath
+
+def ingest(cls, rootpath, items, processes=None, chunksize=1, **kwargs):
+    """writes the datasets in `items` into the tree of the file system-based
+    interface `cls` at `rootpath`, on a pool of `processes` processes.
+
+    `items` is an iterable of (keypath, value) pairs, where `value` is either
+    an array or a picklable callable that returns the array in the worker process
+    (e.g. `functools.partial(numpy.load, path)`), so that the data do not have to
+    be sent to the workers. each worker opens the root with `shared=True`
+    (as well as with `kwargs`) to merge the attributes safely.
+
+    returns the list of the keypaths that have been written."""
+    if not issubclass(cls, FileSystemInterface):
+        raise ValueError(f"ingest() requires a file system-based interface, got '{cls.__name__}'")
+    cls.open(rootpath, **kwargs).close() # creates the root beforehand
+    with _futures.ProcessPoolExecutor(max_workers=processes, initializer=_ingest_init,
+                                      initargs=(cls, rootpath, kwargs)) as pool:
+        return list(pool.map(_ingest_item, items, chunksize=chunksize))
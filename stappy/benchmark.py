@@ -0,0 +1,416 @@
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+stappy.benchmark -- the benchmark suite of the interfaces.
+
+it runs the workloads (scenarios) on each interface over a grid of parameters,
+and reports the throughput, the latency percentiles and the peak memory
+as JSON. each case is run once for warm-up, and then repeated (5 times by
+default; see `--repeats` and `--warmup`) to report the median throughput
+and its spread. run it as e.g.:
+
+```
+python -m stappy.benchmark --output result.json
+python -m stappy.benchmark --backends NPYInterface --baseline result.json
+```
+
+the dataset scenarios ("put", "get") vary the size and the dtype of the arrays,
+and the tree scenarios ("list", "walk", "resolve", "copy", "delete", "attrs")
+vary the fan-out and the depth of the tree. when a baseline is given, the
+median throughput of each result is compared with that of the matching result
+in the baseline, and the exit status becomes 1 if any of them has regressed
+(beyond the tolerance, and beyond the spread of the repeats).
+"""
+
+import sys as _sys
+import os as _os
+import json as _json
+import time as _time
+import shutil as _shutil
+import argparse as _argparse
+import platform as _platform
+import tempfile as _tempfile
+import tracemalloc as _tracemalloc
+import contextlib as _contextlib
+from collections import OrderedDict as _OrderedDict
+
+import numpy as _np
+
+import stappy as _stappy
+
+DATASET_SCENARIOS = ('put', 'get')
+TREE_SCENARIOS    = ('list', 'walk', 'resolve', 'copy', 'delete', 'attrs')
+SCENARIOS         = DATASET_SCENARIOS + TREE_SCENARIOS
+
+DEFAULT_SIZES     = (1 << 12, 1 << 20)
+DEFAULT_DTYPES    = ('float64', 'int16')
+DEFAULT_FANOUTS   = (4, 16)
+DEFAULT_DEPTHS    = (2, 3)
+BYTES_PER_RUN     = 1 << 26 # the total bytes written in a dataset scenario
+DEFAULT_REPEATS   = 5
+DEFAULT_WARMUP    = 1
+
+def backends():
+    """returns the OrderedDict of the concrete interfaces (name --> class)
+    i.e. the subclasses of AbstractInterface that implement `_store_child_dataset`."""
+    found = _OrderedDict()
+    stack = [_stappy.AbstractInterface]
+    while len(stack) > 0:
+        cls = stack.pop(0)
+        if not hasattr(cls._store_child_dataset, '__wrapped__'): # i.e. not an abstractmethod
+            found[cls.__name__] = cls
+        stack.extend(cls.__subclasses__())
+    return found
+
+class Recorder:
+    """records the latency (and the bytes) of each operation."""
+    def __init__(self):
+        self.latencies = []
+        self.nbytes    = 0
+
+    @_contextlib.contextmanager
+    def measure(self, nbytes=0):
+        start = _time.perf_counter()
+        yield
+        self.latencies.append(_time.perf_counter() - start)
+        self.nbytes += nbytes
+
+def _make_array(size, dtype):
+    """returns a (moderately compressible) array of approximately `size` bytes."""
+    dtype  = _np.dtype(dtype)
+    count  = max(1, size // dtype.itemsize)
+    rng    = _np.random.default_rng(0)
+    if dtype.kind == 'f':
+        return rng.standard_normal(count).cumsum().astype(dtype)
+    else:
+        return rng.integers(0, 100, size=count).astype(dtype)
+
+def _build_tree(entry, fanout, depth, value=None, attrs=0):
+    """populates `entry` with the tree of `fanout` children per entry down to `depth`
+    (with the dataset `value` and `attrs` attributes in each entry, if specified).
+    returns the list of the keypaths of the entries."""
+    paths = []
+    def _build(parent, prefix, level):
+        for i in range(fanout):
+            name  = f"n{i}"
+            child = parent.get_entry(name)
+            path  = f"{prefix}{name}"
+            paths.append(path)
+            if value is not None:
+                child.put_dataset("data", value)
+            for j in range(attrs):
+                child.attrs[f"attr{j}"] = j
+            if level < depth:
+                _build(child, path + _stappy.SEP, level + 1)
+    _build(entry, '', 1)
+    entry.flush()
+    return paths
+
+def _scenario_put(root, params, recorder):
+    value = _make_array(params['size'], params['dtype'])
+    for i in range(params['count']):
+        with recorder.measure(value.nbytes):
+            root.put_dataset(f"d{i}", value)
+    root.flush()
+
+def _scenario_get(root, params, recorder):
+    value = _make_array(params['size'], params['dtype'])
+    for i in range(params['count']):
+        root.put_dataset(f"d{i}", value)
+    root.flush()
+    for i in range(params['count']):
+        with recorder.measure(value.nbytes):
+            root.get_dataset(f"d{i}")
+
+def _scenario_list(root, params, recorder):
+    paths = _build_tree(root.get_entry("tree"), params['fanout'], params['depth'])
+    for path in paths:
+        entry = root["tree"][path]
+        with recorder.measure():
+            entry.keys()
+
+def _scenario_walk(root, params, recorder):
+    _build_tree(root.get_entry("tree"), params['fanout'], params['depth'], value=_np.zeros(16))
+    for _ in range(params['repeat']):
+        with recorder.measure():
+            for _ in root.walk():
+                pass
+
+def _scenario_resolve(root, params, recorder):
+    depth = params['depth'] * 4
+    path  = _stappy.SEP.join(f"level{i}" for i in range(depth))
+    root.get_entry(path)
+    root.flush()
+    for _ in range(params['repeat'] * 10):
+        with recorder.measure():
+            root[path]
+
+def _scenario_copy(root, params, recorder):
+    value = _np.zeros(256)
+    _build_tree(root.get_entry("source"), params['fanout'], params['depth'], value=value, attrs=4)
+    for i in range(params['repeat']):
+        with recorder.measure():
+            root.put_entry(f"copy{i}", root["source"])
+            root.flush()
+
+def _scenario_delete(root, params, recorder):
+    value = _np.zeros(256)
+    for i in range(params['repeat']):
+        _build_tree(root.get_entry(f"tree{i}"), params['fanout'], params['depth'], value=value, attrs=4)
+        with recorder.measure():
+            root.delete_entry(f"tree{i}")
+            root.flush()
+
+def _scenario_attrs(root, params, recorder):
+    paths = _build_tree(root.get_entry("tree"), params['fanout'], params['depth'])
+    for path in paths:
+        entry = root["tree"][path]
+        with recorder.measure():
+            for j in range(16):
+                entry.attrs[f"key{j}"] = j
+                entry.attrs[f"group/value{j}"] = str(j)
+            root.flush()
+    for path in paths:
+        entry = root["tree"][path]
+        with recorder.measure():
+            entry._load_info() # re-reads from the storage
+            for j in range(16):
+                entry.attrs[f"group/value{j}"]
+
+def _grid(scenario, sizes, dtypes, fanouts, depths):
+    """yields the parameters of the runs of `scenario`."""
+    if scenario in DATASET_SCENARIOS:
+        for size in sizes:
+            for dtype in dtypes:
+                yield _OrderedDict([('size', size), ('dtype', dtype),
+                                    ('count', max(4, min(1000, BYTES_PER_RUN // size)))])
+    else:
+        for fanout in fanouts:
+            for depth in depths:
+                yield _OrderedDict([('fanout', fanout), ('depth', depth), ('repeat', 3)])
+
+def _summarize(recorder, elapsed, peak):
+    latencies = _np.array(recorder.latencies) * 1e3
+    summary   = _OrderedDict()
+    summary['ops']         = len(latencies)
+    summary['seconds']     = elapsed
+    summary['ops_per_sec'] = (len(latencies) / latencies.sum() * 1e3) if latencies.sum() > 0 else None
+    summary['mb_per_sec']  = (recorder.nbytes / latencies.sum() * 1e3 / 1e6) \
+                             if (recorder.nbytes > 0) and (latencies.sum() > 0) else None
+    summary['latency_ms']  = _OrderedDict((f"p{q}", float(_np.percentile(latencies, q))) for q in (50, 90, 99)) \
+                             if len(latencies) > 0 else None
+    if summary['latency_ms'] is not None:
+        summary['latency_ms']['max'] = float(latencies.max())
+    summary['peak_bytes']  = peak
+    return summary
+
+def _run_once(cls, scenario, params, workdir, memory=True):
+    """runs `scenario` with `params` once on a new root of `cls` in `workdir`,
+    and returns the summary of the run."""
+    rootpath = _os.path.join(workdir, f"{cls.__name__}-{scenario}")
+    recorder = Recorder()
+    if memory == True:
+        _tracemalloc.start()
+    start = _time.perf_counter()
+    try:
+        with cls.open(rootpath) as root:
+            globals()[f"_scenario_{scenario}"](root, params, recorder)
+        elapsed = _time.perf_counter() - start
+        peak    = _tracemalloc.get_traced_memory()[1] if memory == True else None
+    finally:
+        if memory == True:
+            _tracemalloc.stop()
+        if _os.path.isdir(rootpath):
+            _shutil.rmtree(rootpath)
+        elif _os.path.exists(rootpath):
+            _os.unlink(rootpath)
+    return recorder, _summarize(recorder, elapsed, peak)
+
+def _spread(values):
+    values = [value for value in values if value is not None]
+    if len(values) == 0:
+        return None
+    spread = _OrderedDict()
+    spread['min']   = float(min(values))
+    spread['max']   = float(max(values))
+    spread['stdev'] = float(_np.std(values, ddof=1)) if len(values) > 1 else 0.0
+    return spread
+
+def run_one(cls, scenario, params, workdir, memory=True, repeats=5, warmup=1):
+    """runs `scenario` with `params` on `cls`, `warmup` times without
+    recording and then `repeats` times, and returns the summary of the runs.
+
+    the throughput and the duration in the summary are the medians over
+    the repeats (`spread` holds their minimum, maximum and standard deviation),
+    the latency percentiles are taken over all the operations of the repeats,
+    and `peak_bytes` is the largest of the repeats."""
+    if repeats < 1:
+        raise ValueError(f"repeats must be at least 1: {repeats}")
+    for _ in range(warmup):
+        _run_once(cls, scenario, params, workdir, memory=False)
+    pooled = Recorder()
+    runs   = []
+    for _ in range(repeats):
+        recorder, summary = _run_once(cls, scenario, params, workdir, memory=memory)
+        pooled.latencies.extend(recorder.latencies)
+        runs.append(summary)
+
+    def _median(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return float(_np.median(values)) if len(values) > 0 else None
+
+    summary = _summarize(pooled, _median('seconds'), max(run['peak_bytes'] for run in runs) if memory == True else None)
+    summary['ops']         = runs[0]['ops']
+    summary['ops_per_sec'] = _median('ops_per_sec')
+    summary['mb_per_sec']  = _median('mb_per_sec')
+    summary['repeats']     = repeats
+    summary['warmup']      = warmup
+    summary['spread']      = _OrderedDict((key, _spread([run[key] for run in runs]))
+                                          for key in ('ops_per_sec', 'mb_per_sec', 'seconds'))
+    return summary
+
+def run(backend_names=None, scenarios=SCENARIOS, sizes=DEFAULT_SIZES, dtypes=DEFAULT_DTYPES,
+        fanouts=DEFAULT_FANOUTS, depths=DEFAULT_DEPTHS, memory=True, workdir=None, log=None,
+        repeats=DEFAULT_REPEATS, warmup=DEFAULT_WARMUP):
+    """runs the benchmark and returns the report as a JSON-compatible dict.
+    each case is run as described in `run_one`."""
+    available = backends()
+    if backend_names is None:
+        backend_names = tuple(available.keys())
+    for name in backend_names:
+        if name not in available:
+            raise ValueError(f"unknown backend: {name} (expected one of {tuple(available.keys())})")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise ValueError(f"unknown scenario: {scenario} (expected one of {SCENARIOS})")
+
+    results = []
+    with _tempfile.TemporaryDirectory(prefix="stappy-bench-", dir=workdir) as tmp:
+        for name in backend_names:
+            for scenario in scenarios:
+                for params in _grid(scenario, sizes, dtypes, fanouts, depths):
+                    summary = run_one(available[name], scenario, params, tmp, memory=memory,
+                                      repeats=repeats, warmup=warmup)
+                    result  = _OrderedDict([('backend', name), ('scenario', scenario), ('params', params)])
+                    result.update(summary)
+                    results.append(result)
+                    if log is not None:
+                        spread = summary['spread']['ops_per_sec'] or {}
+                        print(f"{name} {scenario} {dict(params)}: {_format_rate(summary['ops_per_sec'])} ops/s "
+                              f"(min {_format_rate(spread.get('min'))}, max {_format_rate(spread.get('max'))})",
+                              file=log, flush=True)
+    report = _OrderedDict()
+    report['stappy']   = _stappy.VERSION_STR
+    report['python']   = _platform.python_version()
+    report['numpy']    = _np.__version__
+    report['platform'] = _platform.platform()
+    report['results']  = results
+    return report
+
+def _format_rate(value):
+    return "n/a" if value is None else f"{value:.1f}"
+
+def _result_key(result):
+    return (result['backend'], result['scenario'], _json.dumps(result['params'], sort_keys=True))
+
+def _throughput_range(result):
+    spread = result.get('spread', {}).get('ops_per_sec', None)
+    return (spread['min'], spread['max']) if spread is not None else (result['ops_per_sec'],) * 2
+
+def compare(report, baseline, tolerance=0.2):
+    """compares the (median) throughput of the results in `report` with that in `baseline`.
+
+    returns the list of the (result, baseline result, ratio, regressed) tuples,
+    where `ratio` is the median throughput relative to the baseline, and `regressed`
+    is True if `ratio < 1 - tolerance` and the fastest of the repeats of the result is
+    still slower than the slowest of the baseline (i.e. the spreads do not overlap).
+    the results that have no counterpart in `baseline` (or no throughput) are not compared."""
+    base = dict((_result_key(result), result) for result in baseline['results'])
+    compared = []
+    for result in report['results']:
+        reference = base.get(_result_key(result), None)
+        if (reference is None) or (not result['ops_per_sec']) or (not reference['ops_per_sec']):
+            continue
+        ratio     = result['ops_per_sec'] / reference['ops_per_sec']
+        regressed = (ratio < 1 - tolerance) and (_throughput_range(result)[1] < _throughput_range(reference)[0])
+        compared.append((result, reference, ratio, regressed))
+    return compared
+
+def _parse_list(convert):
+    def _parse(text):
+        return tuple(convert(item) for item in text.split(',') if len(item.strip()) > 0)
+    return _parse
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(prog="python -m stappy.benchmark",
+                                      description="runs the benchmark of the stappy interfaces.")
+    parser.add_argument('--backends', type=_parse_list(str), default=None,
+                        help="comma-separated interface names (default: all)")
+    parser.add_argument('--scenarios', type=_parse_list(str), default=SCENARIOS,
+                        help=f"comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--sizes', type=_parse_list(int), default=DEFAULT_SIZES,
+                        help="comma-separated array sizes in bytes")
+    parser.add_argument('--dtypes', type=_parse_list(str), default=DEFAULT_DTYPES,
+                        help="comma-separated array dtypes")
+    parser.add_argument('--fanouts', type=_parse_list(int), default=DEFAULT_FANOUTS,
+                        help="comma-separated numbers of children per entry")
+    parser.add_argument('--depths', type=_parse_list(int), default=DEFAULT_DEPTHS,
+                        help="comma-separated depths of the trees")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="do not trace the peak memory (tracing slows down the runs)")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help=f"the number of measured runs of each case (default: {DEFAULT_REPEATS})")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+                        help=f"the number of unmeasured runs before the repeats (default: {DEFAULT_WARMUP})")
+    parser.add_argument('--workdir', default=None, help="the directory to create the trees in")
+    parser.add_argument('--output', '-o', default=None, help="the JSON file to write the report to (default: stdout)")
+    parser.add_argument('--baseline', default=None, help="the JSON report to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="the relative decrease of throughput regarded as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run(backend_names=args.backends, scenarios=args.scenarios, sizes=args.sizes,
+                 dtypes=args.dtypes, fanouts=args.fanouts, depths=args.depths,
+                 memory=not args.no_memory, workdir=args.workdir, log=_sys.stderr,
+                 repeats=args.repeats, warmup=args.warmup)
+    if args.output is None:
+        _json.dump(report, _sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as out:
+            _json.dump(report, out, indent=2)
+
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as src:
+            baseline = _json.load(src)
+        for result, reference, ratio, regressed in compare(report, baseline, tolerance=args.tolerance):
+            if regressed == True:
+                status = 1
+            print(f"{'REGRESSION' if regressed else 'ok':10s} {result['backend']} {result['scenario']} "
+                  f"{dict(result['params'])}: {reference['ops_per_sec']:.1f} --> {result['ops_per_sec']:.1f} ops/s "
+                  f"({(ratio - 1) * 100:+.1f}%)", file=_sys.stderr)
+    return status
+
+if __name__ == '__main__':
+    _sys.exit(main())
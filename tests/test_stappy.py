@@ -0,0 +1,199 @@
+import os
+import sys
+import pathlib
+import subprocess
+
+import numpy as np
+import pytest
+
+import stappy
+
+BACKENDS    = (stappy.NPYInterface, stappy.BareZInterface, stappy.ChunkedZInterface, stappy.PackInterface)
+FS_BACKENDS = BACKENDS[:3]
+REPOSITORY  = pathlib.Path(__file__).resolve().parent.parent
+
+@pytest.fixture(params=BACKENDS, ids=lambda cls: cls.__name__)
+def backend(request):
+    return request.param
+
+@pytest.fixture(params=FS_BACKENDS, ids=lambda cls: cls.__name__)
+def fs_backend(request):
+    return request.param
+
+def run_python(code, *args):
+    """runs `code` in another interpreter (e.g. to exit uncleanly)."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (str(REPOSITORY), env.get('PYTHONPATH', None))))
+    subprocess.run([sys.executable, '-c', code] + [str(arg) for arg in args], env=env, check=True)
+
+def test_round_trip(backend, tmp_path):
+    value = np.arange(60, dtype='f8').reshape(20, 3)
+    root  = backend.open(tmp_path / "root")
+    root.create["a/b"].put_dataset("x", value)
+    root.create["a/b"].put_dataset("s", np.array(7, dtype='>i2'))
+    root.close()
+
+    root  = backend.open(tmp_path / "root")
+    entry = root["a/b"]
+    assert np.array_equal(entry.get_dataset("x"), value)
+    assert entry.get_dataset("s") == 7
+    for selection in (slice(5, 9), (slice(2, 18, 4), 1), [1, 3, 19], value[:, 0] > 50):
+        assert np.array_equal(entry.get_dataset("x", selection=selection), value[selection])
+    entry.append_dataset("x", np.ones((4, 3)))
+    entry.append_dataset("x", np.zeros(3, dtype='i4')) # a single row, safely cast
+    root.close()
+
+    expected = np.concatenate([value, np.ones((4, 3)), np.zeros((1, 3))])
+    root  = backend.open(tmp_path / "root")
+    entry = root["a/b"]
+    assert entry.get_dataset("x").dtype == np.dtype('f8')
+    assert np.array_equal(entry.get_dataset("x"), expected)
+    assert np.array_equal(entry.get_dataset("x", selection=slice(18, 23)), expected[18:23])
+    with pytest.raises(ValueError):
+        entry.append_dataset("x", np.ones((2, 4)))
+    root.close()
+
+@pytest.mark.parametrize("keypaths", (['p/q/r', 'p'], ['p', 'p/q/r'], ['p/q', 'p/q/x', 'p/q']))
+def test_delete_many_nested(backend, tmp_path, keypaths):
+    root = backend.open(tmp_path / "root")
+    root.create["p/q/r"]
+    root["p/q"].put_dataset("x", np.arange(3))
+    root.put_dataset("z", np.arange(3))
+    root.delete_many(keypaths)
+    assert root.has_child("p") == (keypaths[0] == 'p/q')
+    assert root.has_dataset("z")
+    root.close()
+
+def test_append_table_rejects_before_appending(backend, tmp_path):
+    root = backend.open(tmp_path / "root")
+    root.put_table("t", {'a': np.arange(10), 'b': np.ones((10, 3))})
+    with pytest.raises(ValueError):
+        root.append_table("t", {'a': np.arange(2), 'b': np.ones((2, 4))})
+    with pytest.raises(ValueError):
+        root.append_table("t", {'a': np.arange(2), 'b': np.ones((2, 3), dtype='c16')})
+    assert root["t"].get_dataset("a").shape == (10,)
+    root.append_table("t", {'a': np.arange(2), 'b': np.ones((2, 3))})
+    table = root.get_table("t")
+    assert table['a'].shape == (12,)
+    assert table['b'].shape == (12, 3)
+    root.close()
+
+PACK_UNCLEAN_EXIT = '''
+import os, sys, numpy as np, stappy
+root = stappy.PackInterface.open(sys.argv[1])
+root.create["a"].put_dataset("x", np.arange(10))
+root["a"].append_dataset("x", np.arange(5))
+root["a"].attrs["note"] = "flushed"
+root.flush()
+root.create["b"].put_dataset("y", np.ones(3))
+os._exit(0)
+'''
+
+def test_pack_replay_after_unclean_exit(tmp_path):
+    path = tmp_path / "root.pack"
+    run_python(PACK_UNCLEAN_EXIT, path)
+    root = stappy.PackInterface.open(path)
+    assert np.array_equal(root["a"].get_dataset("x"), np.r_[np.arange(10), np.arange(5)])
+    assert root["a"].attrs["note"] == "flushed"
+    if root.has_child("b") and root["b"].has_dataset("y"):
+        assert np.array_equal(root["b"].get_dataset("y"), np.ones(3))
+    root["a"].append_dataset("x", np.arange(2))
+    root.close()
+    root = stappy.PackInterface.open(path)
+    assert root["a"].get_dataset("x").shape == (17,)
+    root.close()
+
+def test_pack_compact(tmp_path):
+    path = tmp_path / "root.pack"
+    root = stappy.PackInterface.open(path)
+    for i in range(5):
+        root.create["a"].put_dataset("x", np.arange(1000) * i)
+    root.create["b"].put_dataset("y", np.ones(1000))
+    root.delete_entry("b")
+    root.flush()
+    size = os.path.getsize(path)
+    assert root.compact() > 0
+    assert os.path.getsize(path) < size
+    assert np.array_equal(root["a"].get_dataset("x"), np.arange(1000) * 4)
+    root.close()
+    root = stappy.PackInterface.open(path)
+    assert not root.has_child("b")
+    assert np.array_equal(root["a"].get_dataset("x"), np.arange(1000) * 4)
+    root.close()
+
+def links(entry, name):
+    return entry._datafile(name).stat().st_nlink
+
+def objects(root):
+    store = pathlib.Path(root._repr) / root._objects_name
+    return sorted(file.name for file in store.rglob("*") if file.is_file() and (file.suffix != '.json'))
+
+@pytest.mark.parametrize("durable", (False, True))
+def test_dedup_references(fs_backend, tmp_path, durable):
+    value = np.arange(1000.)
+    root  = fs_backend.open(tmp_path / "root", dedup=True, durable=durable)
+    for i in range(3):
+        root.create[f"e{i}"].put_dataset("x", value)
+    root.flush()
+    assert links(root["e0"], "x") == 4 # the datasets and the object
+    assert len(objects(root)) == 1
+
+    # copy-on-write upon append
+    root["e0"].append_dataset("x", np.ones(2))
+    root.flush()
+    assert links(root["e0"], "x") == 1
+    assert links(root["e1"], "x") == 3
+    assert np.array_equal(root["e1"].get_dataset("x"), value)
+
+    # the object is removed along with the last dataset that refers to it
+    root["e1"].delete_dataset("x")
+    root.flush()
+    assert links(root["e2"], "x") == 2
+    root.delete_entry("e2")
+    root.flush()
+    assert objects(root) == []
+
+    # update() replaces a deduplicated dataset without writing through the object
+    root.create["keep"].put_dataset("x", value)
+    root.create["over"].put_dataset("x", value)
+    src = fs_backend.open(tmp_path / "src")
+    src.create["over"].put_dataset("x", value + 1)
+    src.flush()
+    root.update(src)
+    root.flush()
+    assert np.array_equal(root["keep"].get_dataset("x"), value)
+    assert np.array_equal(root["over"].get_dataset("x"), value + 1)
+    assert links(root["keep"], "x") == 2 # still shared with the object
+    assert links(root["over"], "x") == 1 # copied from a root without deduplication
+    assert len(objects(root)) == 1
+    src.close()
+    root.close()
+
+DURABLE_UNCLEAN_EXIT = '''
+import os, sys, numpy as np, stappy
+root = getattr(stappy, sys.argv[1]).open(sys.argv[2], durable=True)
+root.create["e"].put_dataset("x", np.arange(1000.))
+root.flush()
+root["e"].put_dataset("x", np.arange(5000.))
+root["e"].put_dataset("y", np.ones(10))
+assert root["e"].get_dataset("x").shape == (5000,)
+if sys.argv[3] == "commit":
+    # exits after the journal is written, before the files are replaced
+    stappy._Staging._apply = staticmethod(lambda links, renames: os._exit(0))
+    root.flush()
+os._exit(0)
+'''
+
+@pytest.mark.parametrize("stage", ("write", "commit"))
+def test_durable_unclean_exit(fs_backend, tmp_path, stage):
+    path = tmp_path / "root"
+    run_python(DURABLE_UNCLEAN_EXIT, fs_backend.__name__, path, stage)
+    root = fs_backend.open(path, durable=True)
+    if stage == "write":
+        assert np.array_equal(root["e"].get_dataset("x"), np.arange(1000.))
+        assert not root["e"].has_dataset("y")
+    else:
+        assert np.array_equal(root["e"].get_dataset("x"), np.arange(5000.))
+        assert np.array_equal(root["e"].get_dataset("y"), np.ones(10))
+    assert list(path.glob(".durable_journal.*")) == []
+    root.close()